@@ -0,0 +1,2 @@
+``Batch`` takes an optional ``count_key`` to remember the length of a sequence without an ``actual_result_count`` across requests.  ``result_count_key`` gives such a key for a catalog query, with a discriminator for any filtering done after the query.
+[agent]
@@ -0,0 +1,2 @@
+Add ``prefetch_objects`` to ``plone.base.batch``, and ``Batch.prefetch_objects`` and ``Batch.objects``.  They ask the ZODB storage to load the objects of the brains on a page in one go.
+[agent]
@@ -0,0 +1,2 @@
+``Batch.pageurl`` encodes the form variables only once and puts in the ``b_start`` of each page.  Add ``Batch.navigation_urls`` to get the urls of ``navurls``, ``prevurls`` and ``nexturls`` at once.
+[agent]
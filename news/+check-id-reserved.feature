@@ -0,0 +1,4 @@
+``check_id`` uses a cached set of reserved ids, including the catalog indexes
+and metadata columns, see ``get_reserved_ids``.  Tool lookups are memoized per
+site for the lifetime of the request.
+[agent]
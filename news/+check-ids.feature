@@ -0,0 +1,4 @@
+Add ``check_ids`` to validate many candidate ids for one container at once.
+Method aliases, the ``checkIdAvailable`` permission and the portal contents
+are computed only once per container.
+[agent]
@@ -0,0 +1,3 @@
+Add ``get_default_pages`` and ``are_default_pages`` to resolve default pages
+for many containers or objects at once, resolving each parent only once.
+[agent]
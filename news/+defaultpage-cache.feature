@@ -0,0 +1,3 @@
+Memoize ``get_default_page`` for the lifetime of the request.
+The ``default_page`` view and ``is_default_page`` share the same cache.
+[agent]
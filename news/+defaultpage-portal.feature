@@ -0,0 +1,4 @@
+Cache the portal level traversals done by ``get_default_page`` for legacy
+``default_page`` attributes in a bounded LRU cache, for hits and misses.
+It is cleared when content is added, removed or renamed.
+[agent]
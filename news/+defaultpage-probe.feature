@@ -0,0 +1,3 @@
+``get_default_page`` probes the few candidate ids in the folder instead of
+building a set of all ``objectIds()``, so it no longer scales with folder size.
+[agent]
@@ -0,0 +1,9 @@
+Record the resolved default page id on containers when they are modified,
+and add ``get_default_page_from_brain`` and ``is_default_page_from_brain``
+to answer default page questions from the ``default_page_id`` catalog
+metadata column.  The subscriber, and a plone.indexer indexer for the
+column, are registered in the new ``configure.zcml`` of this package.  It
+is loaded in Plone by a ``z3c.autoinclude`` entry point; other setups need
+``<include package="plone.base" />``.  Sites add the ``default_page_id``
+metadata column to their catalog to use it.
+[agent]
@@ -0,0 +1,2 @@
+Add ``get_timestamps``, ``expired_mask`` and ``visible_mask`` to ``plone.base.utils`` to check expiration and effective dates of many items against one "now".
+[agent]
@@ -0,0 +1,2 @@
+``get_formatstring_from_registry`` keeps a snapshot of the date format override records, which is cleared when a record changes.
+[agent]
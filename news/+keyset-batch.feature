@@ -0,0 +1,3 @@
+Add ``KeysetBatch`` to ``plone.base.batch``, for paging through catalog results with cursors instead of start offsets.
+It has the attributes used by the batch navigation templates of ``plone.batching``; a batch view links to its pages with ``pageurl``.
+[agent]
@@ -0,0 +1,2 @@
+Add ``iter_listing_rows`` to ``plone.base.utils``, which yields the title, expiry, size and localized dates of catalog brains for listings in one pass.
+[agent]
@@ -0,0 +1,2 @@
+Add ``plone.base.livesearch.livesearch``, which filters the previous results of the same browser when a livesearch query only adds or extends terms, instead of querying the catalog again.
+[agent]
@@ -0,0 +1,2 @@
+Add ``tokenize_search_term``, which returns the atoms of a munged search query.  Results are cached, and a query that adds terms to a cached query reuses its tokens.
+[agent]
@@ -0,0 +1,3 @@
+``ulocalized_time`` and ``is_expired`` handle ``datetime`` objects and timestamps with the standard library instead of converting them to ``DateTime``.
+``is_expired`` also parses ISO strings with the standard library; like ``DateTime`` it reads naive ISO strings as UTC.
+[agent]
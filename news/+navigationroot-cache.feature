@@ -0,0 +1,6 @@
+Memoize ``get_navigation_root`` and ``get_navigation_root_object`` for the
+lifetime of the request.  ``get_navigation_root`` finds the closest
+navigation root by a longest prefix match on the cached paths of all
+navigation roots, see ``get_navigation_root_paths``, and only checks the
+parents of the context below it for roots that are not indexed yet.
+[agent]
@@ -0,0 +1,3 @@
+Add ``get_navigation_root_from_path`` to get the navigation root for a
+physical path or catalog brain without loading the object.
+[agent]
@@ -0,0 +1,5 @@
+Add ``reserve_id`` to pick a unique id for a new item and reserve it until
+the transaction ends, so concurrent requests adding items with the same
+title to one folder get different ids instead of conflicting.  After the
+commit, the id stays reserved for transactions that started before it.
+[agent]
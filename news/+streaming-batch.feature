@@ -0,0 +1,2 @@
+Add ``StreamingBatch`` to ``plone.base.batch``, a batch for iterators and sequences of unknown length that fetches only one item past the current page.
+[agent]
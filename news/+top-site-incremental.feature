@@ -0,0 +1,4 @@
+``get_top_site_from_url`` traverses the URL path one segment at a time
+instead of from the root for every prefix, and memoizes its result per
+virtual hosting root and URL for the lifetime of the request.
+[agent]
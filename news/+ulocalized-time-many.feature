@@ -0,0 +1,2 @@
+Add ``ulocalized_time_many`` to ``plone.base.i18nl10n`` to localize a sequence of times with one format and translation lookup.
+[agent]
@@ -0,0 +1,2 @@
+``ulocalized_time`` parses and translates each date format only once per request, and gets all date elements with a single ``strftime`` call.
+[agent]
@@ -0,0 +1,3 @@
+Cache the result of ``get_user_friendly_types`` per site until the types tool
+or the ``types_not_searched`` setting changes.
+[agent]
@@ -1,7 +1,76 @@
+from Acquisition import aq_base
+from Acquisition import aq_parent
+from DateTime import DateTime
+from itertools import islice
+from plone.base.cache import LRUCache
+from plone.base.utils import _catalog_user_key
 from plone.batching.batch import QuantumBatch
 from plone.batching.utils import calculate_pagerange
+from urllib.parse import quote
+from ZODB.POSException import ConflictError
 from ZTUtils import make_query
 
+import base64
+import hashlib
+import json
+
+# Query keys that do not change the number of results
+_UNCOUNTED_QUERY_KEYS = frozenset(
+    ("sort_on", "sort_order", "sort_limit", "b_start", "b_size")
+)
+
+# Total number of results, keyed by result_count_key
+_result_counts = LRUCache(maxsize=1000, ttl=300)
+
+
+def query_fingerprint(query):
+    """Return a string identifying the results of a catalog query.
+
+    Sorting and batching criteria are left out, and the order of keys and of
+    the values in lists does not matter.
+    """
+    items = sorted(
+        (name, _normalize_query_value(value))
+        for name, value in query.items()
+        if name not in _UNCOUNTED_QUERY_KEYS
+    )
+    return hashlib.sha1(repr(items).encode("utf-8")).hexdigest()
+
+
+def _normalize_query_value(value):
+    if isinstance(value, dict):
+        return sorted(
+            (name, _normalize_query_value(item)) for name, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sorted(repr(_normalize_query_value(item)) for item in value)
+    return repr(value)
+
+
+def result_count_key(catalog, query, discriminator):
+    """Return the key for the number of results of query in the catalog.
+
+    Use it as the ``count_key`` of a Batch over results that do not know
+    their ``actual_result_count``, like results filtered or merged after
+    the catalog query.  The key has the change counter of the catalog, so
+    counts are not reused after the catalog changed, and the roles and
+    groups of the current user, which the catalog filters on.
+    ``discriminator`` must tell apart everything else the results depend
+    on, like the name of the view and the values its filter uses; pass
+    None for unfiltered results.  It is part of the key, so it must be
+    hashable.  Counts expire after some minutes, for content that becomes
+    effective or expires.  Returns None if the catalog has no change counter.
+    """
+    if getattr(aq_base(catalog), "getCounter", None) is None:
+        return None
+    return (
+        catalog.getPhysicalPath(),
+        catalog.getCounter(),
+        _catalog_user_key(catalog),
+        query_fingerprint(query),
+        discriminator,
+    )
+
 
 class Batch(QuantumBatch):
     b_start_str = "b_start"
@@ -17,12 +86,32 @@ class Batch(QuantumBatch):
         pagerange=7,
         quantumleap=0,
         b_start_str="b_start",
+        count_key=None,
     ):
+        # With a count_key, the length of a sequence without an
+        # actual_result_count is remembered across requests.
+        self.count_key = count_key
         super().__init__(
             sequence, size, start, end, orphan, overlap, pagerange, quantumleap
         )
         self.b_start_str = b_start_str
 
+    @property
+    def sequence_length(self):
+        length = self.__dict__.get("_sequence_length")
+        if length is not None:
+            return length
+        # Catalog results know their length, which is always up to date.
+        length = getattr(self._sequence, "actual_result_count", None)
+        if length is None and self.count_key is not None:
+            length = _result_counts.get(self.count_key)
+            if length is None:
+                length = _result_counts[self.count_key] = len(self._sequence)
+        if length is None:
+            length = len(self._sequence)
+        self._sequence_length = length
+        return length
+
     def __len__(self):
         # Note: Using len() was deprecated for several years.
         # It was recommended to explicitly either use the `length` attribute
@@ -63,7 +152,22 @@ class Batch(QuantumBatch):
         if pagenumber == -1:
             pagenumber = self.pagenumber
         b_start = pagenumber * (self.pagesize - self.overlap) - self.pagesize
-        return make_query(formvariables, {self.b_start_str: b_start})
+        prefix, suffix = self._query_template(formvariables)
+        return f"{prefix}{b_start}{suffix}"
+
+    def _query_template(self, formvariables):
+        # The query string of make_query for the form variables, split at
+        # the value of b_start.  Kept while the form variables are the same.
+        items = list(formvariables.items())
+        template = getattr(self, "_query_template_cache", None)
+        if template is None or template[0] != items:
+            marker = quote(self.b_start_str) + ":int="
+            query = make_query(formvariables, {self.b_start_str: 0}).split("&")
+            index = query.index(marker + "0")
+            prefix = "&".join(query[:index] + [marker])
+            suffix = "".join("&" + part for part in query[index + 1 :])
+            template = self._query_template_cache = (items, prefix, suffix)
+        return template[1], template[2]
 
     def navurls(self, formvariables, navlist=None):
         # Returns the page number and url for the navigation quick links.
@@ -84,5 +188,445 @@ class Batch(QuantumBatch):
         # Helper method to get next navigation list from templates.
         return self.navurls(formvariables, self.next_pages)
 
+    def navigation_urls(self, formvariables):
+        # Returns the page numbers and urls of navurls, prevurls and nexturls
+        # at once.
+        return {
+            "navurls": list(self.navurls(formvariables)),
+            "prevurls": list(self.prevurls(formvariables)),
+            "nexturls": list(self.nexturls(formvariables)),
+        }
+
     prevlist = QuantumBatch.previous_pages
     nextlist = QuantumBatch.next_pages
+
+    def prefetch_objects(self):
+        # Prefetches the objects of the catalog brains on this page, see
+        # prefetch_objects.
+        prefetch_objects(self)
+
+    def objects(self):
+        # Iterates over the objects of the catalog brains on this page,
+        # after prefetching them.
+        self.prefetch_objects()
+        for brain in self:
+            yield brain.getObject()
+
+
+def prefetch_objects(brains):
+    """Ask the storage to load the objects of catalog brains in one go.
+
+    The containers of the objects are traversed to, to find the objects
+    without loading them.  Then the storage can fetch all of them in a
+    single round trip, if it supports prefetching like ZEO and RelStorage
+    do.  Objects that cannot be found are ignored, getObject will deal with
+    them.
+    """
+    ids_by_parent = {}
+    for brain in brains:
+        get_path = getattr(brain, "getPath", None)
+        if get_path is None:
+            continue
+        parent_path, _, id = get_path().rpartition("/")
+        if parent_path not in ids_by_parent:
+            ids_by_parent[parent_path] = (aq_parent(brain), [])
+        ids_by_parent[parent_path][1].append(id)
+
+    ghosts = {}
+    for parent_path, (catalog, ids) in ids_by_parent.items():
+        try:
+            parent = aq_base(catalog.unrestrictedTraverse(parent_path))
+        except ConflictError:
+            raise
+        except Exception:
+            continue
+        # BTreeFolder2 keeps its items in a BTree, other folders as attributes
+        tree = getattr(parent, "_tree", None)
+        for id in ids:
+            if tree is not None:
+                obj = tree.get(id)
+            else:
+                obj = getattr(parent, "__dict__", {}).get(id)
+            jar = getattr(obj, "_p_jar", None)
+            if jar is not None and obj._p_changed is None:
+                ghosts.setdefault(jar, []).append(obj)
+
+    for jar, objs in ghosts.items():
+        prefetch = getattr(jar, "prefetch", None)
+        if prefetch is not None:
+            prefetch(objs)
+
+
+class StreamingBatch:
+    """Batch over an iterator or a sequence of unknown length.
+
+    Only ``size + 1`` items from ``start`` on are fetched, the extra item
+    tells whether there is a next page.  Iterators are consumed up to there.
+    The total number of items and pages is unknown, so ``sequence_length``,
+    ``numpages`` and ``lastpage`` are None and the navigation only reaches
+    one page past the current one, without a link to the last page.  The
+    url methods work like those of Batch.  Like in plone.batching, a size
+    below one gives pages of 25 items, and a negative start is the first page.
+    """
+
+    overlap = 0
+    firstpage = 1
+    lastpage = None
+    numpages = None
+    sequence_length = None
+    show_link_to_last = False
+    before_last_page_not_in_navlist = False
+
+    def __init__(self, sequence, size, start=0, pagerange=7, b_start_str="b_start"):
+        if size < 1:
+            # the default page size of plone.batching for a size below one
+            size = 25
+        self.pagesize = size
+        self.b_start_str = b_start_str
+        # start on a page boundary, like the b_start of pageurl
+        start = max(start, 0)
+        self.start = start - start % size
+        self.pagenumber = self.start // size + 1
+        if hasattr(sequence, "__getitem__"):
+            items = list(sequence[self.start : self.start + size + 1])
+        else:
+            items = list(islice(sequence, self.start, self.start + size + 1))
+        self.has_next = len(items) > size
+        self.has_previous = self.pagenumber > 1
+        self._items = items[:size]
+        self.length = len(self._items)
+        self.end = self.start + self.length
+        self.multiple_pages = self.has_next or self.has_previous
+
+        last = self.pagenumber + 1 if self.has_next else self.pagenumber
+        first = max(1, last - pagerange + 1)
+        self.navlist = range(first, last + 1)
+        self.previous_pages = self.prevlist = range(first, self.pagenumber)
+        self.next_pages = self.nextlist = range(self.pagenumber + 1, last + 1)
+        self.previouspage = self.pagenumber - 1
+        self.nextpage = self.pagenumber + 1
+        self.show_link_to_first = 1 not in self.navlist
+        self.second_page_not_in_navlist = 2 not in self.navlist
+        # The next page has at least one item, count it as a full page.
+        self.next_item_count = size if self.has_next else 0
+
+    @property
+    def islastpage(self):
+        return not self.has_next
+
+    @property
+    def items_on_page(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return bool(self.length)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    pageurl = Batch.pageurl
+    _query_template = Batch._query_template
+    navurls = Batch.navurls
+    navigation_urls = Batch.navigation_urls
+
+    def prevurls(self, formvariables):
+        # Unlike navurls, this is empty on the first page.
+        return [(x, self.pageurl(formvariables, x)) for x in self.previous_pages]
+
+    def nexturls(self, formvariables):
+        # Unlike navurls, this is empty on the last page.
+        return [(x, self.pageurl(formvariables, x)) for x in self.next_pages]
+
+
+class KeysetBatch:
+    """Batch over catalog results with keyset (cursor) pagination.
+
+    Instead of a start offset, pages are identified by an opaque cursor with
+    the sort key and UID of the last item of the previous page, or the first
+    item of the next page when going back.  The catalog is queried for the
+    items after that key only, so deep pages cost as much as the first one.
+    A range criterion on ``sort_on`` in the query is narrowed to that key;
+    with other criteria on ``sort_on`` the earlier items are skipped instead.
+
+    ``sort_on`` must be an index and a metadata column, and the catalog must
+    have a ``UID`` index and metadata column, which breaks ties.  The batch
+    has the attributes of Batch used by the batch navigation templates.
+    Only the first, previous and next page can be linked to, so the other
+    pages and the last page are left out, and ``sequence_length``,
+    ``numpages`` and ``lastpage`` are None.  ``pageurl`` gives the query
+    strings with the cursors, for the ``make_link`` of a batch view.
+    """
+
+    b_cursor_str = "b_cursor"
+    firstpage = 1
+    lastpage = None
+    numpages = None
+    sequence_length = None
+    show_link_to_last = False
+    before_last_page_not_in_navlist = False
+
+    def __init__(
+        self,
+        catalog,
+        query,
+        size,
+        sort_on,
+        cursor=None,
+        reverse=False,
+        b_cursor_str="b_cursor",
+    ):
+        self.pagesize = size
+        self.sort_on = sort_on
+        self.reverse = reverse
+        self.b_cursor_str = b_cursor_str
+        # The catalog sorts on the values in the index, which may be less
+        # precise than the metadata, like for a DateIndex.
+        self._index = catalog._catalog.getIndex(sort_on)
+        position = _decode_cursor(cursor)
+        if position is not None:
+            try:
+                items = self._fetch(catalog, query, position)
+            except ConflictError:
+                raise
+            except Exception:
+                # A crafted cursor with a key the index cannot compare
+                position = None
+        if position is None:
+            cursor = None
+            items = self._fetch(catalog, query, None)
+        self.cursor = cursor
+
+        more = len(items) > size
+        backwards = position is not None and position[3]
+        if backwards:
+            items = items[:size]
+            items.reverse()
+            self.has_previous = more
+            self.has_next = True
+            # the page we came from
+            self.next_item_count = size
+        else:
+            self.has_previous = position is not None
+            self.has_next = more
+            self.next_item_count = len(items) - size if more else 0
+            items = items[:size]
+        if self.has_previous:
+            self.pagenumber = max(position[4], 2)
+        else:
+            self.pagenumber = 1
+        self._items = items
+        self.length = len(items)
+        self.multiple_pages = self.has_next or self.has_previous
+
+        self.previouspage = self.pagenumber - 1 if self.has_previous else None
+        self.nextpage = self.pagenumber + 1 if self.has_next else None
+        self.previous_pages = self.prevlist = (
+            [self.previouspage] if self.has_previous else []
+        )
+        self.next_pages = self.nextlist = [self.nextpage] if self.has_next else []
+        self.navlist = self.previous_pages + [self.pagenumber] + self.next_pages
+        self.show_link_to_first = 1 not in self.navlist
+        self.second_page_not_in_navlist = self.show_link_to_first and (
+            2 not in self.navlist
+        )
+
+    def _fetch(self, catalog, query, position):
+        # Returns the items after position: the page and the next page going
+        # forward, the page and one more going back.
+        backwards = position is not None and position[3]
+        limit = self.pagesize + 1 if backwards else 2 * self.pagesize
+        # going back, we search in the reverse order
+        descending = self.reverse != backwards
+        query = dict(query)
+        query["sort_on"] = [self.sort_on, "UID"]
+        query["sort_order"] = "descending" if descending else "ascending"
+        if position is not None:
+            value, entry, uid = position[:3]
+            seen = (entry, uid)
+            query[self.sort_on] = _bound_criterion(
+                query.get(self.sort_on), value, descending
+            )
+        results = catalog.searchResults(**query)
+
+        items = []
+        for brain in results:
+            if position is not None and not items:
+                # skip the items with the same key up to the cursor
+                item = (self._index.getEntryForObject(brain.getRID()), brain.UID)
+                if item >= seen if descending else item <= seen:
+                    continue
+            items.append(brain)
+            if len(items) >= limit:
+                break
+        return items
+
+    @property
+    def b_start_str(self):
+        # The request variable with the position, for batch views
+        return self.b_cursor_str
+
+    @property
+    def islastpage(self):
+        return not self.has_next
+
+    @property
+    def items_on_page(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return self.length
+
+    def __bool__(self):
+        return bool(self.length)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def _cursor(self, brain, backwards, pagenumber):
+        return _encode_cursor(
+            getattr(brain, self.sort_on),
+            self._index.getEntryForObject(brain.getRID()),
+            brain.UID,
+            backwards,
+            pagenumber,
+        )
+
+    @property
+    def next_cursor(self):
+        # cursor of the next page, None if this is the last one
+        if not self.has_next or not self._items:
+            return None
+        return self._cursor(self._items[-1], False, self.nextpage)
+
+    @property
+    def previous_cursor(self):
+        # cursor of the previous page, None if this is the first one
+        if not self.has_previous or not self._items:
+            return None
+        return self._cursor(self._items[0], True, self.previouspage)
+
+    def nexturl(self, formvariables):
+        # Query string of the next page, None if this is the last one.
+        cursor = self.next_cursor
+        if cursor is None:
+            return None
+        return make_query(formvariables, {self.b_cursor_str: cursor})
+
+    def prevurl(self, formvariables):
+        # Query string of the previous page, None if this is the first one.
+        cursor = self.previous_cursor
+        if cursor is None:
+            return None
+        return make_query(formvariables, {self.b_cursor_str: cursor})
+
+    def pageurl(self, formvariables, pagenumber=-1):
+        # Query string of the current, first, previous or next page, None
+        # for other pages, which cannot be reached with a cursor.
+        if pagenumber == -1:
+            pagenumber = self.pagenumber
+        if pagenumber == 1:
+            formvariables = dict(formvariables)
+            formvariables.pop(self.b_cursor_str, None)
+            return make_query(formvariables)
+        if pagenumber == self.pagenumber:
+            return make_query(formvariables, {self.b_cursor_str: self.cursor})
+        if pagenumber == self.previouspage:
+            return self.prevurl(formvariables)
+        if pagenumber == self.nextpage:
+            return self.nexturl(formvariables)
+        return None
+
+    def navurls(self, formvariables, navlist=None):
+        # Returns the page number and url for the navigation quick links.
+        if not navlist:
+            navlist = self.navlist
+        return [(x, self.pageurl(formvariables, x)) for x in navlist]
+
+    def prevurls(self, formvariables):
+        return (
+            self.navurls(formvariables, self.previous_pages)
+            if self.has_previous
+            else []
+        )
+
+    def nexturls(self, formvariables):
+        return self.navurls(formvariables, self.next_pages) if self.has_next else []
+
+    navigation_urls = Batch.navigation_urls
+
+
+def _bound_criterion(criterion, value, descending):
+    # The criterion on the sort index, limited to the items from value on.
+    # A range criterion of the caller is intersected with the bound.  Other
+    # criteria are kept as they are, the items before the cursor are then
+    # skipped in _fetch.
+    if criterion is None:
+        return {"query": value, "range": "max" if descending else "min"}
+    if not isinstance(criterion, dict) or not set(criterion) <= {"query", "range"}:
+        return criterion
+    range_ = criterion.get("range")
+    if range_ not in ("min", "max", "min:max"):
+        return criterion
+    keys = criterion.get("query")
+    if not isinstance(keys, (list, tuple)):
+        keys = [keys]
+    try:
+        low = min(keys) if "min" in range_ else None
+        high = max(keys) if "max" in range_ else None
+        if descending:
+            high = value if high is None else min(high, value)
+        else:
+            low = value if low is None else max(low, value)
+    except (TypeError, ValueError):
+        # keys that cannot be compared with the value
+        return criterion
+    if low is None:
+        return {"query": high, "range": "max"}
+    if high is None:
+        return {"query": low, "range": "min"}
+    return {"query": [low, high], "range": "min:max"}
+
+
+def _encode_cursor(value, entry, uid, backwards, pagenumber):
+    data = json.dumps(
+        [_encode_key(value), _encode_key(entry), uid, backwards, pagenumber],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor):
+    # Returns (value, index entry, uid, backwards, page number), or None for
+    # the first page, also when the cursor is not valid.
+    if not cursor:
+        return None
+    try:
+        value, entry, uid, backwards, pagenumber = json.loads(
+            base64.urlsafe_b64decode(cursor)
+        )
+        if not isinstance(uid, str) or type(pagenumber) is not int:
+            return None
+        return _decode_key(value), _decode_key(entry), uid, bool(backwards), pagenumber
+    except Exception:
+        return None
+
+
+def _encode_key(key):
+    if isinstance(key, DateTime):
+        return {"DateTime": key.micros()}
+    return key
+
+
+def _decode_key(key):
+    if isinstance(key, dict):
+        return DateTime(key["DateTime"] / 1000000.0)
+    return key
@@ -0,0 +1,87 @@
+"""
+Small caching helpers shared by the plone.base utilities.
+"""
+
+from collections import OrderedDict
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
+
+import threading
+import time
+
+
+def get_request_cache(name, request=None):
+    """Return a dictionary to memoize values for the lifetime of a request.
+
+    The dictionary is stored in the annotations of the request under the key
+    ``plone.base.<name>``.  If no request is given, the global request is
+    used.  Returns None if there is no request or it cannot be annotated;
+    callers must then compute their value without caching.
+    """
+    if request is None:
+        request = getRequest()
+    if request is None:
+        return None
+    annotations = IAnnotations(request, None)
+    if annotations is None:
+        return None
+    key = "plone.base." + name
+    cache = annotations.get(key, None)
+    if cache is None:
+        cache = annotations[key] = {}
+    return cache
+
+
+def clear_request_cache(name, request=None):
+    """Forget all values memoized under ``name`` for the request."""
+    cache = get_request_cache(name, request)
+    if cache is not None:
+        cache.clear()
+
+
+class LRUCache:
+    """A bounded, thread safe mapping for process wide caches.
+
+    When more than ``maxsize`` entries are stored, the least recently used
+    ones are discarded.  If ``ttl`` is given, entries older than ``ttl``
+    seconds are discarded as well.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, stored = self._data[key]
+            except KeyError:
+                return default
+            if self.ttl is not None and time.monotonic() - stored > self.ttl:
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            try:
+                return self._data.pop(key)[0]
+            except KeyError:
+                return default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
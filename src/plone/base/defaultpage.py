@@ -1,6 +1,9 @@
 from Acquisition import aq_base
 from Acquisition import aq_inner
 from Acquisition import aq_parent
+from Missing import MV
+from plone.base.cache import get_request_cache
+from plone.base.cache import LRUCache
 from plone.base.interfaces.defaultpage import IDefaultPage
 from plone.registry.interfaces import IRegistry
 from Products.BTreeFolder2.BTreeFolder2 import BTreeFolder2Base
@@ -15,8 +18,18 @@ from zope.component import queryMultiAdapter
 from zope.component import queryUtility
 from zope.interface import implementer
 
+_marker = object()
 
-def get_default_page(context):
+# Name of the catalog metadata column with the default page id recorded on
+# a container, see DefaultPageIdIndexer.
+DEFAULT_PAGE_METADATA = "default_page_id"
+
+# Whether a default page can be traversed to from the portal (step 3.2 of
+# get_default_page), keyed by the portal path and the page.
+_portal_pages = LRUCache(maxsize=1000, ttl=300)
+
+
+def get_default_page(context, request=None):
     """Given a folderish item, find out if it has a default-page using
     the following lookup rules:
 
@@ -36,19 +49,45 @@ def get_default_page(context):
     The id of the first matching item is then used to lookup a translation
     and if found, its id is returned. If no default page is set, None is
     returned. If a non-folderish item is passed in, return None always.
+
+    The result is memoized for the lifetime of the (given or global) request,
+    keyed by the physical path and ``_p_mtime`` of the container.
     """
     # met precondition?
     if not IFolderish.providedBy(context):
         return
 
+    key = _default_page_cache_key(context)
+    cache = get_request_cache("defaultpage", request) if key is not None else None
+    if cache is None:
+        return _get_default_page(context)
+    page = cache.get(key, _marker)
+    if page is _marker:
+        page = cache[key] = _get_default_page(context)
+    return page
+
+
+def _default_page_cache_key(context):
+    base = aq_base(context)
+    if getattr(base, "_p_changed", False):
+        # Changed in this transaction, so _p_mtime does not reflect it yet.
+        return None
+    try:
+        path = context.getPhysicalPath()
+    except AttributeError:
+        return None
+    return path, getattr(base, "_p_mtime", None)
+
+
+def _get_default_page(context):
+    """Uncached lookup of the default page, see get_default_page."""
+
     # The ids where we look for default - must support __contains__
     ids = set()
 
-    # For BTreeFolders we just use the __contains__ otherwise build a set
-    if isinstance(aq_base(context), BTreeFolder2Base):
-        ids = context
-    elif hasattr(aq_base(context), "objectIds"):
-        ids = set(context.objectIds())
+    # Probe the few candidate ids instead of building a set of all ids
+    if hasattr(aq_base(context), "objectIds"):
+        ids = _ContainedIds(context)
 
     # 1. test for contentish index_html
     if "index_html" in ids:
@@ -87,7 +126,7 @@ def get_default_page(context):
 
     # 3.2 Test for default page in portal, acquire
     for page in pages:
-        if portal.unrestrictedTraverse(page, None):
+        if _traversable_from_portal(portal, page):
             return page
 
     # 4. Test for default sitewide default_page setting
@@ -97,13 +136,57 @@ def get_default_page(context):
             return page
 
 
-def is_default_page(container, obj):
+def _traversable_from_portal(portal, page):
+    key = (portal.getPhysicalPath(), page)
+    found = _portal_pages.get(key)
+    if found is None:
+        found = _portal_pages[key] = bool(portal.unrestrictedTraverse(page, None))
+    return found
+
+
+def clear_portal_default_pages(obj, event):
+    """Event subscriber forgetting the cached portal lookups of step 3.2 of
+    get_default_page when content is added, removed or renamed.
+    """
+    _portal_pages.clear()
+
+
+class _ContainedIds:
+    """Membership test for the ids of the items contained in a folder.
+
+    get_default_page only tests a handful of candidate ids, so probing each of
+    them is O(k), where ``set(context.objectIds())`` is O(n) in folder size.
+    """
+
+    def __init__(self, context):
+        self.context = context
+
+    def __contains__(self, id):
+        base = aq_base(self.context)
+        if isinstance(base, BTreeFolder2Base):
+            return base.has_key(id)
+        if hasattr(base, "_objects"):
+            # OFS.ObjectManager stores its items as instance attributes.
+            # Make sure we found an item and not some other attribute.
+            ob = getattr(base, "__dict__", {}).get(id, None)
+            if ob is None or id[:1] == "_":
+                return False
+            get_id = getattr(ob, "getId", None)
+            return callable(get_id) and get_id() == id
+        if hasattr(base, "__contains__"):
+            return id in self.context
+        if hasattr(base, "hasObject"):
+            return bool(self.context.hasObject(id))
+        return id in self.context.objectIds()
+
+
+def is_default_page(container, obj, request=None):
     """Finds out if the given obj is the default page in its parent folder.
 
     Only considers explicitly contained objects, either set as index_html,
     with the default_page property, or using IBrowserDefault.
     """
-    parent_default_page = get_default_page(container)
+    parent_default_page = get_default_page(container, request)
     precondition = (
         parent_default_page is not None
         and "/" not in parent_default_page
@@ -112,13 +195,152 @@ def is_default_page(container, obj):
     return precondition and (parent_default_page == obj.getId())
 
 
+def get_default_pages(containers, request=None):
+    """Resolve the default page of many containers at once.
+
+    Returns a mapping of the physical path (as string) of each container to
+    its default page id, or None.  Each container is resolved only once.
+    """
+    result = {}
+    for container in containers:
+        path = "/".join(container.getPhysicalPath())
+        if path not in result:
+            result[path] = get_default_page(container, request)
+    return result
+
+
+def are_default_pages(objs, request=None):
+    """Find out for many objects whether they are the default page of their
+    parent folder.
+
+    Returns a mapping of the physical path (as string) of each object to a
+    boolean.  The objects are grouped by parent, so the default page of each
+    parent is resolved only once.  See is_default_page for the rules.
+    """
+    parents = {}
+    by_parent = {}
+    for obj in objs:
+        obj = aq_inner(obj)
+        parent = aq_parent(obj)
+        if parent is None:
+            parent_path = None
+        else:
+            parent_path = "/".join(parent.getPhysicalPath())
+            parents.setdefault(parent_path, parent)
+        by_parent.setdefault(parent_path, []).append(obj)
+
+    default_pages = get_default_pages(parents.values(), request)
+    result = {}
+    for parent_path, children in by_parent.items():
+        page = default_pages.get(parent_path)
+        if page is not None and "/" in page:
+            page = None
+        for obj in children:
+            path = "/".join(obj.getPhysicalPath())
+            result[path] = (
+                page is not None
+                and hasattr(aq_base(obj), "getId")
+                and page == obj.getId()
+            )
+    return result
+
+
+def record_default_page(container):
+    """Record the resolved default page id on the container.
+
+    The id is stored without acquisition, an empty string meaning that there
+    is no default page.  This is called on modification of a container, and
+    should be called by code changing the default page or layout without
+    firing an event.  Only if the value changed, the container is written
+    and its catalog metadata is updated.
+    """
+    if not IFolderish.providedBy(container):
+        return
+    page = _get_default_page(container)
+    key = _default_page_cache_key(container)
+    if key is not None:
+        cache = get_request_cache("defaultpage")
+        if cache is not None:
+            cache[key] = page
+    page = page or ""
+    base = aq_base(container)
+    if getattr(base, "_default_page_id", None) == page:
+        return
+    base._default_page_id = page
+    if getattr(base, "reindexObject", None) is not None:
+        # The catalog has no metadata-only reindex: an empty idxs list means
+        # all indexes.  The getId index is cheap, and its value is unchanged,
+        # so in effect only the metadata of the container is updated.
+        container.reindexObject(idxs=["getId"])
+
+
+def update_recorded_default_page(obj, event):
+    """Event subscriber recording the default page of a modified container.
+
+    Adding or removing items fires an IContainerModifiedEvent on the
+    container as well.
+    """
+    record_default_page(obj)
+
+
+def get_recorded_default_page(obj):
+    """Return the default page id recorded on the container.
+
+    Returns an empty string if the container has no default page and None if
+    nothing was recorded yet.
+    """
+    return getattr(aq_base(obj), "_default_page_id", None)
+
+
+class DefaultPageIdIndexer:
+    """Indexer for the ``default_page_id`` catalog metadata column.
+
+    It is registered in configure.zcml as the ``IIndexer`` of plone.indexer
+    for all objects, so items do not acquire the value of their container.
+    Objects that are not folderish, or have nothing recorded yet, get no
+    value.
+    """
+
+    def __init__(self, context, catalog):
+        self.context = context
+
+    def __call__(self):
+        page = None
+        if IFolderish.providedBy(self.context):
+            page = get_recorded_default_page(self.context)
+        if page is None:
+            raise AttributeError(DEFAULT_PAGE_METADATA)
+        return page
+
+
+def get_default_page_from_brain(brain):
+    """Return the default page id of the container of the catalog brain.
+
+    The answer comes from the ``default_page_id`` metadata column, without
+    waking up the container.  Only if nothing was recorded for the container
+    yet do we fall back to get_default_page on the object.
+    """
+    page = getattr(brain, DEFAULT_PAGE_METADATA, None)
+    if page is None or page is MV:
+        return get_default_page(brain.getObject())
+    return page or None
+
+
+def is_default_page_from_brain(parent_brain, brain):
+    """Finds out if the item of brain is the default page of the container
+    of parent_brain, see is_default_page.
+    """
+    page = get_default_page_from_brain(parent_brain)
+    return page is not None and "/" not in page and page == brain.getId
+
+
 @implementer(IDefaultPage)
 class DefaultPageView(BrowserView):
     def isDefaultPage(self, obj):
-        return is_default_page(aq_inner(self.context), obj)
+        return is_default_page(aq_inner(self.context), obj, self.request)
 
     def getDefaultPage(self):
-        return get_default_page(aq_inner(self.context))
+        return get_default_page(aq_inner(self.context), self.request)
 
 
 def _getDefaultPageView(obj, request):
@@ -3,8 +3,12 @@ Collection of i18n and l10n utility methods.
 """
 
 from Acquisition import aq_acquire
+from Acquisition import aq_base
+from datetime import datetime
 from DateTime import DateTime
 from DateTime.interfaces import IDateTime
+from plone.base.cache import get_request_cache
+from plone.base.cache import LRUCache
 from plone.registry.interfaces import IRegistry
 from zope.component import getUtility
 from zope.i18n import translate
@@ -143,15 +147,55 @@ def utranslate(
     )
 
 
+# Snapshots of the date format override records, keyed by registry, see
+# _registry_key.  They are cleared when a record changes.  Changes made by
+# other ZEO clients are picked up when the snapshot expires.
+_formatstring_overrides = LRUCache(maxsize=100, ttl=60)
+_override_root = "Products.CMFPlone.i18nl10n.override_dateformat."
+
+
 def get_formatstring_from_registry(msgid):
     """If the Enabled record is True, return a format string."""
     registry = getUtility(IRegistry)
-    name_root = "Products.CMFPlone.i18nl10n.override_dateformat."
-    if registry.get(name_root + "Enabled", False) is False:
+    key, owner = _registry_key(registry)
+    entry = _formatstring_overrides.get(key)
+    if entry is None or entry[0] is not owner:
+        if registry.get(_override_root + "Enabled", False) is False:
+            snapshot = False
+        else:
+            snapshot = {}
+        _formatstring_overrides[key] = (owner, snapshot)
+    else:
+        snapshot = entry[1]
+    if snapshot is False:
         return None
-    # msgid: "date_format_long", "date_format_short", or "time_format"
-    record_name = name_root + msgid
-    return registry.get(record_name, None)
+    try:
+        return snapshot[msgid]
+    except KeyError:
+        # msgid: "date_format_long", "date_format_short", or "time_format"
+        record_name = _override_root + msgid
+        value = snapshot[msgid] = registry.get(record_name, None)
+        return value
+
+
+def _registry_key(registry):
+    # The key of the snapshot of the registry, and the object the snapshot
+    # must be kept with.  A persistent registry is identified by the name
+    # of its database and its oid, as oids are only unique per database.
+    # Other registries by their id, and the snapshot keeps the registry, so
+    # the id is not reused while the snapshot exists.
+    base = aq_base(registry)
+    jar = getattr(base, "_p_jar", None)
+    oid = getattr(base, "_p_oid", None)
+    if jar is not None and oid is not None:
+        return (jar.db().database_name, oid), None
+    return id(base), base
+
+
+def clear_formatstring_overrides(event):
+    """Forget the override snapshots when an override record changes."""
+    if getattr(event.record, "__name__", "").startswith(_override_root):
+        _formatstring_overrides.clear()
 
 
 def ulocalized_time(
@@ -200,7 +244,63 @@ def ulocalized_time(
     # %Y        Year with century as a decimal number.
     # %Z        Time zone name (no characters if no time zone exists).
 
-    mapping = {}
+    if context is None:
+        # when without context, we cannot do very much.
+        time = _to_DateTime(time)
+        return time.ISO8601() if time is not None else None
+
+    # convert to something we can call strftime on
+    time = _to_local_time(time)
+    if time is None:
+        return None
+
+    if request is None:
+        request = aq_acquire(context, "REQUEST")
+
+    plan = _get_format_plan(msgid, long_format, domain, request, target_language)
+    return plan.format(time, request)
+
+
+def ulocalized_time_many(
+    times,
+    long_format=None,
+    time_only=False,
+    context=None,
+    domain="plonelocales",
+    request=None,
+    target_language=None,
+):
+    """Localize a sequence of times, see ulocalized_time.
+
+    The request, the format and the translations are looked up once for
+    all times.  Returns a list with a string for each time, or None for the
+    times that cannot be converted to a DateTime.
+    """
+    if time_only:
+        msgid = "time_format"
+    elif long_format:
+        msgid = "date_format_long"
+    else:
+        msgid = "date_format_short"
+
+    plan = None
+    if context is not None:
+        if request is None:
+            request = aq_acquire(context, "REQUEST")
+        plan = _get_format_plan(msgid, long_format, domain, request, target_language)
+
+    result = []
+    for time in times:
+        if plan is None:
+            time = _to_DateTime(time)
+            result.append(time.ISO8601() if time is not None else None)
+            continue
+        time = _to_local_time(time)
+        result.append(plan.format(time, request) if time is not None else None)
+    return result
+
+
+def _to_DateTime(time):
     # convert to DateTime instances. Either a date string or
     # a DateTime instance needs to be passed.
     if not IDateTime.providedBy(time):
@@ -209,14 +309,28 @@ def ulocalized_time(
         except Exception:
             logger.debug(f"Failed to convert {time} to a DateTime object")
             return None
-
-    if context is None:
-        # when without context, we cannot do very much.
-        return time.ISO8601()
-
-    if request is None:
-        request = aq_acquire(context, "REQUEST")
-
+    return time
+
+
+def _to_local_time(time):
+    # DateTime formats in the local time zone.  We do the same for datetimes
+    # and timestamps using a naive datetime in local time, which is a lot
+    # cheaper than converting them to DateTime.  Anything else is converted
+    # to DateTime, None is returned if that fails.
+    try:
+        if isinstance(time, datetime):
+            if time.tzinfo is not None:
+                time = time.astimezone().replace(tzinfo=None)
+            return time
+        if isinstance(time, (int, float)) and not isinstance(time, bool):
+            return datetime.fromtimestamp(time)
+    except (OverflowError, OSError, ValueError):
+        pass
+    return _to_DateTime(time)
+
+
+def _get_format_plan(msgid, long_format, domain, request, target_language):
+    # The format plan for msgid, memoized for the lifetime of the request.
     if long_format and isinstance(long_format, str):
         # 0. If a format is explicitly passed in the long_format argument, this wins.
         #    Hopefully something like this: "${a} ${d} ${b} ${Y}""
@@ -226,18 +340,31 @@ def ulocalized_time(
         # the format string there should override the translation machinery
         formatstring = get_formatstring_from_registry(msgid)
 
+    key = (msgid, formatstring, domain, target_language)
+    cache = get_request_cache("ulocalized_time", request)
+    plan = cache.get(key, None) if cache is not None else None
+    if plan is None:
+        plan = _compile_format_plan(
+            msgid, formatstring, domain, request, target_language
+        )
+        if cache is not None:
+            cache[key] = plan
+    return plan
+
+
+def _compile_format_plan(msgid, formatstring, domain, request, target_language):
     if formatstring is not None:
         if _dt_format_string_regexp.findall(formatstring):
             # This is classic strftime formatting with percentages instead of dollars,
             # e.g. %Y instead of ${Y} for the year.  This means we cannot do further
             # i18n/l10n for translating week days or month names.  Python will do
             # translation using the current locale.
-            return time.strftime(formatstring)
+            return _FormatPlan(formatstring)
     else:
         # 2. the normal case: translation machinery,
         # that is the ".../LC_MESSAGES/plonelocales.po" files
         formatstring = translate(
-            msgid, domain, mapping, request, target_language=target_language
+            msgid, domain, {}, request, target_language=target_language
         )
 
     # 3. if both failed, fall back to hardcoded ISO style
@@ -250,45 +377,14 @@ def ulocalized_time(
             formatstring = "%H:%M"  # 03:14
         else:
             formatstring = "[INTERNAL ERROR]"
-        return time.strftime(formatstring)
-
-    # get the format elements used in the formatstring
-    formatelements = {el[2:-1] for el in _interp_regex.findall(formatstring)}
-
-    # add used elements to mapping
-    elements = formatelements & datetime_formatvariables
-    for key in elements:
-        mapping[key] = time.strftime("%" + key)
-
-    # add weekday name, abbr. weekday name, month name, abbr month name
-    name_elements = formatelements & name_formatvariables
-    if {"a", "A"} & name_elements:
-        weekday = int(time.strftime("%w"))  # weekday, sunday = 0
-        if "a" in name_elements:
-            mapping["a"] = weekdayname_msgid_abbr(weekday)
-        if "A" in name_elements:
-            mapping["A"] = weekdayname_msgid(weekday)
-    if {"b", "B"} & name_elements:
-        monthday = int(time.strftime("%m"))  # month, january = 1
-        if "b" in name_elements:
-            mapping["b"] = monthname_msgid_abbr(monthday)
-        if "B" in name_elements:
-            mapping["B"] = monthname_msgid(monthday)
-
-    # translate translateable elements
-    for key in name_elements:
-        mapping[key] = translate(
-            mapping[key],
-            domain,
-            context=request,
-            default=mapping[key],
-            target_language=target_language,
-        )
+        return _FormatPlan(formatstring)
 
-    # translate the time string
-    return translate(
-        formatstring, domain, mapping, request, target_language=target_language
+    # The format string itself is translated as well, before the date
+    # elements are filled in.
+    translated = translate(
+        formatstring, domain, None, request, target_language=target_language
     )
+    return _FormatPlan(formatstring, translated, domain, target_language)
 
 
 def _numbertoenglishname(number, format=None, attr="_days"):
@@ -349,3 +445,95 @@ def weekdayname_msgid_short(number):
     # use to translate to 2 char format (Mo, Tu, ...)
     # e.g. weekday_mon_short, weekday_tue_short, ...
     return "weekday_%s_short" % weekdayname_english(number, format="a").lower()
+
+
+# separator for getting several strftime directives in one call
+_DIRECTIVE_SEPARATOR = "\x1f"
+# regexp for the placeholders of the translated format string, this must
+# match the one used by zope.i18n.interpolate.
+_placeholder_regexp = re.compile(
+    r"(?<!\$)\$(?:([a-zA-Z_][-a-zA-Z0-9_]*)|{([a-zA-Z_][-a-zA-Z0-9_]*)})"
+)
+_name_msgids = {
+    "a": weekdayname_msgid_abbr,
+    "A": weekdayname_msgid,
+    "b": monthname_msgid_abbr,
+    "B": monthname_msgid,
+}
+
+
+class _FormatPlan:
+    """A format for ulocalized_time, parsed once.
+
+    Either a strftime format string, or a translated format string with
+    ``${X}`` placeholders.  For the latter the placeholders are split out in
+    advance, all date elements are fetched with a single strftime call, and
+    the translated weekday and month names are remembered.
+    """
+
+    def __init__(
+        self, formatstring, translated=None, domain=None, target_language=None
+    ):
+        self.strftime = formatstring if translated is None else None
+        if self.strftime is not None:
+            return
+        self.domain = domain
+        self.target_language = target_language
+        # get the format elements used in the formatstring
+        formatelements = {el[2:-1] for el in _interp_regex.findall(formatstring)}
+        self.elements = formatelements & datetime_formatvariables
+        self.name_elements = formatelements & name_formatvariables
+        directives = set(self.elements)
+        if {"a", "A"} & self.name_elements:
+            directives.add("w")  # weekday, sunday = 0
+        if {"b", "B"} & self.name_elements:
+            directives.add("m")  # month, january = 1
+        self.directives = sorted(directives)
+        self.directives_format = _DIRECTIVE_SEPARATOR.join(
+            "%" + key for key in self.directives
+        )
+        # literal text and (name, placeholder) tuples
+        self.pieces = []
+        position = 0
+        for match in _placeholder_regexp.finditer(translated):
+            if match.start() > position:
+                self.pieces.append(translated[position : match.start()])
+            self.pieces.append((match.group(1) or match.group(2), match.group(0)))
+            position = match.end()
+        if position < len(translated):
+            self.pieces.append(translated[position:])
+        self.names = {}
+
+    def format(self, time, request):
+        if self.strftime is not None:
+            return time.strftime(self.strftime)
+        values = {}
+        if self.directives:
+            values = dict(
+                zip(
+                    self.directives,
+                    time.strftime(self.directives_format).split(_DIRECTIVE_SEPARATOR),
+                )
+            )
+        mapping = {key: values[key] for key in self.elements}
+        for key in self.name_elements:
+            number = int(values["w" if key in ("a", "A") else "m"])
+            mapping[key] = self.translate_name(key, number, request)
+        return "".join(
+            piece if isinstance(piece, str) else mapping.get(*piece)
+            for piece in self.pieces
+        )
+
+    def translate_name(self, key, number, request):
+        # translated weekday or month name
+        name = self.names.get((key, number))
+        if name is None:
+            msgid = _name_msgids[key](number)
+            name = self.names[(key, number)] = translate(
+                msgid,
+                self.domain,
+                context=request,
+                default=msgid,
+                target_language=self.target_language,
+            )
+        return name
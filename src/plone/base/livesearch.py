@@ -0,0 +1,139 @@
+"""
+Livesearch with incremental narrowing of results.
+
+While a user types, each keystroke sends a query that extends the previous
+one.  The catalog record ids found for the previous query of the user are
+remembered, and when the new query can only match a subset of them, they
+are filtered with the lexicon of the text index instead of running a new
+catalog query.
+"""
+
+from AccessControl import getSecurityManager
+from Acquisition import aq_base
+from plone.base.cache import LRUCache
+from plone.base.utils import _catalog_user_key
+from plone.base.utils import get_user_friendly_types
+from plone.base.utils import tokenize_search_term
+from plone.registry.interfaces import IRegistry
+from Products.CMFCore.utils import getToolByName
+from zope.component import getUtility
+
+# Previous results are only remembered when there are no more than this.
+MAX_CANDIDATES = 1000
+
+# Tokens and record ids of the previous query, keyed by catalog, change
+# counter of the catalog, roles and groups of the user, browser id and the
+# other criteria of the query.
+_candidates = LRUCache(maxsize=1000, ttl=300)
+
+
+def livesearch(context, text, limit=None, index="SearchableText", **query):
+    """Search the catalog for the livesearch text of the current user.
+
+    ``text`` is munged with munge_search_term and searched in ``index``, the
+    other keyword arguments are added to the catalog query.  If not given,
+    only the user friendly types are searched.  Returns a list of at most
+    ``limit`` catalog brains, or an empty list if livesearch is disabled.
+
+    If the previous query of the user had the same criteria and the new
+    text only adds terms or extends prefix terms of the previous text, the
+    previous results are filtered.  They keep their order, so results sorted
+    by relevance keep the ranking of the first query.  Previous queries are
+    remembered per browser id, and for authenticated users without one per
+    user.  Anonymous users without a browser id always search the catalog.
+    """
+    registry = getUtility(IRegistry)
+    if not registry.get("plone.enable_livesearch", False):
+        return []
+    tokens = tokenize_search_term(text)
+    if not tokens:
+        return []
+    if "portal_type" not in query:
+        query["portal_type"] = get_user_friendly_types()
+
+    catalog = getToolByName(context, "portal_catalog")
+    key = _candidates_key(context, catalog, index, query)
+    rids = None
+    if key is not None:
+        previous = _candidates.get(key)
+        if previous is not None:
+            rids = _narrow(catalog, index, previous[0], previous[1], tokens)
+
+    if rids is None:
+        query[index] = " AND ".join(tokens)
+        results = catalog.searchResults(**query)
+        if key is None or len(results) > MAX_CANDIDATES:
+            if key is not None:
+                _candidates.pop(key)
+            return list(results[:limit])
+        rids = [brain.getRID() for brain in results]
+    _candidates[key] = (tokens, rids)
+
+    if limit is not None:
+        rids = rids[:limit]
+    return [catalog._catalog[rid] for rid in rids]
+
+
+def _candidates_key(context, catalog, index, query):
+    # None if the catalog has no change counter, or if the user is anonymous
+    # and has no browser id, so there is nothing telling users apart.
+    if getattr(aq_base(catalog), "getCounter", None) is None:
+        return None
+    browser_id = _get_browser_id(context)
+    if browser_id is None and getSecurityManager().getUser().getId() is None:
+        return None
+    criteria = tuple(sorted((name, repr(value)) for name, value in query.items()))
+    return (
+        catalog.getPhysicalPath(),
+        catalog.getCounter(),
+        _catalog_user_key(catalog),
+        browser_id,
+        index,
+        criteria,
+    )
+
+
+def _get_browser_id(context):
+    # The existing browser id of the request, a new one is not created.
+    manager = getToolByName(context, "browser_id_manager", None)
+    if manager is None:
+        return None
+    try:
+        return manager.getBrowserId(create=False)
+    except AttributeError:
+        # No request
+        return None
+
+
+def _narrow(catalog, index, previous, rids, tokens):
+    # Filter the rids found for the previous tokens with the new tokens.
+    # Returns None if the new tokens may match documents not found before.
+    added = list(tokens)
+    extended = []
+    for token in previous:
+        if token in added:
+            added.remove(token)
+        elif token.endswith("*"):
+            extended.append(token[:-1])
+        else:
+            return None
+    # Only prefix terms can be checked, and every prefix term that is no
+    # longer there must have been extended.
+    if not all(token.endswith("*") and not token.startswith('"') for token in added):
+        return None
+    if not all(any(token.startswith(prefix) for token in added) for prefix in extended):
+        return None
+    if not added:
+        return rids
+
+    zindex = catalog._catalog.getIndex(index)
+    if getattr(aq_base(zindex), "getLexicon", None) is None:
+        return None
+    lexicon = zindex.getLexicon()
+    for token in added:
+        words = lexicon.parseTerms(token)
+        if len(words) != 1 or not lexicon.isGlob(words[0]):
+            return None
+        wids = set(lexicon.globToWordIds(words[0]))
+        rids = [rid for rid in rids if not wids.isdisjoint(zindex.index.get_words(rid))]
+    return rids
@@ -1,12 +1,18 @@
 from Acquisition import aq_base
 from Acquisition import aq_inner
 from Acquisition import aq_parent
+from plone.base.cache import get_request_cache
+from plone.base.cache import LRUCache
 from plone.base.interfaces import INavigationRoot
 from plone.registry.interfaces import IRegistry
 from Products.CMFCore.utils import getToolByName
 from zope.component import getUtility
 from zope.component.hooks import getSite
 
+# Paths of the navigation roots of a site, keyed by the portal path and the
+# change counter of the catalog.
+_navigation_root_paths = LRUCache(maxsize=50)
+
 
 def get_navigation_root(context, relativeRoot=None):
     """Get the path to the root of the navigation tree.
@@ -23,14 +29,97 @@ def get_navigation_root(context, relativeRoot=None):
 
     Else, a root must be computed: loop from the context to the portal,
     through parents, looking for an object implementing INavigationRoot.
-    Return the path of that root.
+    Return the path of that root.  With a catalog that has a change counter,
+    the loop stops at the closest navigation root found in the catalog.
+
+    The result is memoized for the lifetime of the request, keyed by the
+    path of the context.
     """
+    try:
+        key = ("/".join(context.getPhysicalPath()), relativeRoot)
+    except AttributeError:
+        key = None
+    cache = get_request_cache("navigationroot") if key is not None else None
+    if cache is None:
+        return _get_navigation_root(context, relativeRoot)
+    root = cache.get(key, None)
+    if root is None:
+        root = cache[key] = _get_navigation_root(context, relativeRoot)
+    return root
+
+
+def _get_navigation_root(context, relativeRoot=None):
     try:
         # URLTool is a portal tool from CMFCore
         portal_url = getToolByName(context, "portal_url")
     except AttributeError:
         return "/".join(getSite().getPhysicalPath())
 
+    root = _get_relative_root(portal_url, relativeRoot)
+    if root is not None:
+        return root
+
+    # compute the root: the longest known navigation root path containing
+    # the context, if the catalog keeps track of them.
+    paths = get_navigation_root_paths(context)
+    if paths is not None:
+        path = context.getPhysicalPath()
+        root = _find_navigation_root_path(paths, "/".join(path))
+        if root is not None:
+            return _get_unindexed_root(context, path, root) or root
+
+    # else walk up from the context
+    portal = portal_url.getPortalObject()
+    root = get_navigation_root_object(context, portal)
+    return "/".join(root.getPhysicalPath())
+
+
+def _get_unindexed_root(context, path, root):
+    # Path of a navigation root below root that is not in the catalog yet,
+    # walking up the already loaded parents of the context.  None if there
+    # is none.
+    obj = context
+    for end in range(len(path), len(root.split("/")), -1):
+        if INavigationRoot.providedBy(obj):
+            return "/".join(path[:end])
+        obj = aq_parent(aq_inner(obj))
+        if obj is None:
+            break
+    return None
+
+
+def get_navigation_root_from_path(path, context=None, relativeRoot=None):
+    """Get the path to the root of the navigation tree for a physical path.
+
+    Like get_navigation_root, but for a physical path (string or tuple) or a
+    catalog brain, so that the object does not need to be loaded.  The root
+    is looked up in get_navigation_root_paths, so navigation roots that are
+    not (re)indexed yet are not found.  Only if the catalog has no change
+    counter, the object is traversed to.
+    """
+    if context is None:
+        context = getSite()
+    get_path = getattr(path, "getPath", None)
+    if get_path is not None:
+        path = get_path()
+    elif not isinstance(path, str):
+        path = "/".join(path)
+
+    portal_url = getToolByName(context, "portal_url")
+    root = _get_relative_root(portal_url, relativeRoot)
+    if root is not None:
+        return root
+
+    paths = get_navigation_root_paths(context)
+    if paths is None:
+        obj = portal_url.getPortalObject().unrestrictedTraverse(path)
+        return get_navigation_root(obj, relativeRoot)
+    return _find_navigation_root_path(paths, path) or portal_url.getPortalPath()
+
+
+def _get_relative_root(portal_url, relativeRoot):
+    # Path of the navigation root given by relativeRoot or the registry,
+    # None if not configured.
     if relativeRoot is None:
         # fetch from configuration registry
         registry = getUtility(IRegistry)
@@ -47,14 +136,61 @@ def get_navigation_root(context, relativeRoot=None):
 
         portalPath = portal_url.getPortalPath()
         return portalPath + relativeRoot
+    return None
 
-    # compute the root
-    portal = portal_url.getPortalObject()
-    root = get_navigation_root_object(context, portal)
-    return "/".join(root.getPhysicalPath())
+
+def get_navigation_root_paths(context):
+    """Return a set with the physical paths of all navigation roots.
+
+    The paths come from a catalog query for INavigationRoot, plus the portal
+    itself.  They are cached until the change counter of the catalog changes,
+    so in-place changes are picked up after a reindex of the object.
+    Returns None if the catalog has no change counter.
+    """
+    catalog = getToolByName(context, "portal_catalog", None)
+    if getattr(aq_base(catalog), "getCounter", None) is None:
+        return None
+    portal_path = getToolByName(context, "portal_url").getPortalPath()
+    key = (portal_path, catalog.getCounter())
+    paths = _navigation_root_paths.get(key)
+    if paths is None:
+        brains = catalog.unrestrictedSearchResults(
+            object_provides=INavigationRoot.__identifier__
+        )
+        paths = frozenset([portal_path] + [brain.getPath() for brain in brains])
+        _navigation_root_paths[key] = paths
+    return paths
+
+
+def _find_navigation_root_path(paths, path):
+    # Longest prefix of path (on segment boundaries) found in paths.
+    while path:
+        if path in paths:
+            return path
+        path = path.rpartition("/")[0]
+    return None
 
 
 def get_navigation_root_object(context, portal):
+    """Get the navigation root object for the context.
+
+    Walks up from the context until an object implementing INavigationRoot
+    or the portal is found.  Memoized for the lifetime of the request.
+    """
+    try:
+        key = (context.getPhysicalPath(), portal.getPhysicalPath())
+    except AttributeError:
+        key = None
+    cache = get_request_cache("navigationrootobject") if key is not None else None
+    if cache is None:
+        return _get_navigation_root_object(context, portal)
+    root = cache.get(key, None)
+    if root is None:
+        root = cache[key] = _get_navigation_root_object(context, portal)
+    return root
+
+
+def _get_navigation_root_object(context, portal):
     obj = context
     while not INavigationRoot.providedBy(obj) and aq_base(obj) is not aq_base(portal):
         parent = aq_parent(aq_inner(obj))
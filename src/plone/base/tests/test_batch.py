@@ -1,3 +1,6 @@
+from unittest.mock import patch
+from zope.component.testing import tearDown
+from ZTUtils import make_query
 from ZTUtils.Lazy import LazyMap
 
 import unittest
@@ -40,3 +43,557 @@ class TestBatch(unittest.TestCase):
             list(batch.nexturls({})),
             [(10, "b_start:int=90")],
         )
+
+    def test_pageurl_form_variables(self):
+        from plone.base.batch import Batch
+        from ZTUtils import make_query
+
+        batch = Batch(range(100), size=10, start=30)
+        for formvariables in (
+            {},
+            {"SearchableText": "spam & eggs", "portal_type": ["Document", "News"]},
+            {"a": 1, "b_start": 20, "z": "last"},
+            {"b_start": 20},
+        ):
+            for pagenumber in (1, 4, 10):
+                self.assertEqual(
+                    batch.pageurl(formvariables, pagenumber),
+                    make_query(formvariables, {"b_start": (pagenumber - 1) * 10}),
+                )
+        # Changed form variables are picked up.
+        formvariables = {"a": 1}
+        self.assertEqual(batch.pageurl(formvariables), "a:int=1&b_start:int=30")
+        formvariables["a"] = 2
+        self.assertEqual(batch.pageurl(formvariables), "a:int=2&b_start:int=30")
+
+    def test_navigation_urls(self):
+        from plone.base.batch import Batch
+
+        batch = Batch(range(100), size=10, start=30, b_start_str="start")
+        urls = batch.navigation_urls({"q": "spam"})
+        self.assertEqual(urls["navurls"], list(batch.navurls({"q": "spam"})))
+        self.assertEqual(
+            urls["prevurls"],
+            [
+                (1, "q=spam&start:int=0"),
+                (2, "q=spam&start:int=10"),
+                (3, "q=spam&start:int=20"),
+            ],
+        )
+        self.assertEqual(urls["nexturls"][0], (5, "q=spam&start:int=40"))
+
+
+QUERY = {"portal_type": "Document"}
+
+
+def render_navigation(batch, form):
+    # Render the batch navigation template of plone.batching, with links
+    # made by the pageurl of the batch.
+    from plone.batching.browser import BatchView
+    from zope.component import provideAdapter
+    from zope.interface import Interface
+    from zope.publisher.browser import TestRequest
+    from zope.traversing.adapters import DefaultTraversable
+    from zope.traversing.interfaces import ITraversable
+
+    class View(BatchView):
+        def make_link(self, pagenumber):
+            return "http://nohost/search?" + batch.pageurl(form, pagenumber)
+
+    provideAdapter(DefaultTraversable, (Interface,), ITraversable)
+    return View(None, TestRequest(form=form))(batch)
+
+
+class DummyItem:
+    portal_type = "Document"
+
+    def __init__(self, key, uid):
+        self.key = key
+        self.UID = uid
+
+
+class TestKeysetBatch(unittest.TestCase):
+    def setUp(self):
+        from Products.PluginIndexes.FieldIndex.FieldIndex import FieldIndex
+        from Products.ZCatalog.ZCatalog import ZCatalog
+
+        self.catalog = ZCatalog("catalog")
+        for name in ("key", "UID", "portal_type"):
+            self.catalog.addIndex(name, FieldIndex(name))
+            self.catalog.addColumn(name)
+        # keys with ties, in UID order: (0, a0) (0, a1) (1, b0) ... (4, e1)
+        for number in range(10):
+            key, tie = divmod(number, 2)
+            uid = "abcde"[key] + str(tie)
+            self.catalog.catalog_object(DummyItem(key, uid), uid)
+
+    def tearDown(self):
+        tearDown()
+
+    def pages(self, reverse=False, size=3, query=QUERY):
+        from plone.base.batch import KeysetBatch
+
+        batch = KeysetBatch(self.catalog, query, size, "key", reverse=reverse)
+        pages = [batch]
+        while batch.next_cursor:
+            batch = KeysetBatch(
+                self.catalog,
+                query,
+                size,
+                "key",
+                cursor=batch.next_cursor,
+                reverse=reverse,
+            )
+            pages.append(batch)
+        return pages
+
+    def test_forward(self):
+        pages = self.pages()
+        self.assertEqual(
+            [[brain.UID for brain in page] for page in pages],
+            [["a0", "a1", "b0"], ["b1", "c0", "c1"], ["d0", "d1", "e0"], ["e1"]],
+        )
+        self.assertEqual(
+            [(page.has_previous, page.has_next) for page in pages],
+            [(False, True), (True, True), (True, True), (True, False)],
+        )
+        self.assertIsNone(pages[0].prevurl({}))
+        self.assertIsNone(pages[-1].nexturl({}))
+        self.assertTrue(pages[0].nexturl({"q": 1}).startswith("q:int=1&b_cursor="))
+        self.assertEqual(len(pages[-1]), 1)
+
+    def test_backward(self):
+        from plone.base.batch import KeysetBatch
+
+        for reverse in (False, True):
+            pages = self.pages(reverse=reverse)
+            batch = pages[-1]
+            for page in reversed(pages[:-1]):
+                batch = KeysetBatch(
+                    self.catalog,
+                    QUERY,
+                    3,
+                    "key",
+                    cursor=batch.previous_cursor,
+                    reverse=reverse,
+                )
+                self.assertEqual(
+                    [brain.UID for brain in batch], [brain.UID for brain in page]
+                )
+                self.assertEqual(batch.has_previous, page.has_previous)
+                self.assertTrue(batch.has_next)
+            self.assertIsNone(batch.previous_cursor)
+
+    def test_reverse(self):
+        pages = self.pages(reverse=True, size=4)
+        self.assertEqual(
+            [[brain.UID for brain in page] for page in pages],
+            [["e1", "e0", "d1", "d0"], ["c1", "c0", "b1", "b0"], ["a1", "a0"]],
+        )
+
+    def test_filter_on_sort_index(self):
+        from plone.base.batch import KeysetBatch
+
+        for criterion, reverse, expected in (
+            (
+                {"query": 3, "range": "max"},
+                False,
+                [["a0", "a1", "b0"], ["b1", "c0", "c1"], ["d0", "d1"]],
+            ),
+            (
+                {"query": 3, "range": "max"},
+                True,
+                [["d1", "d0", "c1"], ["c0", "b1", "b0"], ["a1", "a0"]],
+            ),
+            (
+                {"query": [1, 3], "range": "min:max"},
+                False,
+                [["b0", "b1", "c0"], ["c1", "d0", "d1"]],
+            ),
+            (
+                {"query": 2, "range": "min"},
+                True,
+                [["e1", "e0", "d1"], ["d0", "c1", "c0"]],
+            ),
+            # Not a range, the items before the cursor are skipped.
+            ([1, 3], False, [["b0", "b1", "d0"], ["d1"]]),
+        ):
+            query = dict(QUERY, key=criterion)
+            pages = self.pages(reverse=reverse, query=query)
+            self.assertEqual(
+                [[brain.UID for brain in page] for page in pages], expected
+            )
+            # and back again
+            batch = KeysetBatch(
+                self.catalog,
+                query,
+                3,
+                "key",
+                cursor=pages[-1].previous_cursor,
+                reverse=reverse,
+            )
+            self.assertEqual([brain.UID for brain in batch], expected[-2])
+
+    def test_cursor(self):
+        from DateTime import DateTime
+        from plone.base.batch import _decode_cursor
+        from plone.base.batch import _encode_cursor
+        from plone.base.batch import KeysetBatch
+
+        now = DateTime()
+        self.assertEqual(
+            _decode_cursor(_encode_cursor(now, 1, "uid", True, 2)),
+            (now, 1, "uid", True, 2),
+        )
+        self.assertIsNone(_decode_cursor("not a cursor"))
+        self.assertIsNone(_decode_cursor(_encode_cursor(1, 1, None, False, 2)))
+        self.assertIsNone(_decode_cursor(_encode_cursor(1, 1, "uid", False, "2")))
+        # An invalid cursor gives the first page.
+        for cursor in (
+            "garbage",
+            # keys the index cannot compare
+            _encode_cursor("x", "x", "u1", False, 2),
+            _encode_cursor(None, None, "u1", False, 2),
+            _encode_cursor(1, [1], "u1", True, 2),
+        ):
+            batch = KeysetBatch(self.catalog, QUERY, 3, "key", cursor=cursor)
+            self.assertEqual([brain.UID for brain in batch], ["a0", "a1", "b0"])
+            self.assertEqual(batch.pagenumber, 1)
+            self.assertIsNone(batch.cursor)
+
+    def test_navigation(self):
+        pages = self.pages()
+        self.assertEqual([page.pagenumber for page in pages], [1, 2, 3, 4])
+        first, second, third, last = pages
+        self.assertEqual(first.navlist, [1, 2])
+        self.assertEqual((first.previouspage, first.nextpage), (None, 2))
+        self.assertFalse(first.show_link_to_first)
+        self.assertEqual(third.navlist, [2, 3, 4])
+        self.assertEqual(third.previous_pages, [2])
+        self.assertEqual(third.next_pages, [4])
+        self.assertTrue(third.show_link_to_first)
+        self.assertFalse(third.second_page_not_in_navlist)
+        self.assertEqual(third.next_item_count, 1)
+        self.assertEqual(last.navlist, [3, 4])
+        self.assertTrue(last.second_page_not_in_navlist)
+        self.assertEqual(last.next_pages, [])
+        self.assertTrue(last.islastpage)
+        for page in pages:
+            self.assertIsNone(page.lastpage)
+            self.assertFalse(page.show_link_to_last)
+            self.assertFalse(page.before_last_page_not_in_navlist)
+
+        form = {"q": "spam", "b_cursor": third.cursor}
+        self.assertEqual(third.pageurl(form, 1), "q=spam")
+        self.assertEqual(third.pageurl(form), make_query(form))
+        self.assertEqual(third.pageurl(form, 2), third.prevurl(form))
+        self.assertEqual(third.pageurl(form, 4), third.nexturl(form))
+        self.assertIsNone(third.pageurl(form, 5))
+        self.assertEqual(third.prevurls(form), [(2, third.prevurl(form))])
+        self.assertEqual(third.nexturls(form), [(4, third.nexturl(form))])
+        self.assertEqual(first.prevurls(form), [])
+        self.assertEqual(last.nexturls(form), [])
+        self.assertEqual(len(second.navigation_urls(form)["navurls"]), 3)
+        # Going back, the page numbers follow.
+        from plone.base.batch import KeysetBatch
+
+        batch = KeysetBatch(self.catalog, QUERY, 3, "key", cursor=third.previous_cursor)
+        self.assertEqual(batch.pagenumber, 2)
+        batch = KeysetBatch(self.catalog, QUERY, 3, "key", cursor=batch.previous_cursor)
+        self.assertEqual(batch.pagenumber, 1)
+
+    def test_navigation_template(self):
+        pages = self.pages()
+        html = render_navigation(pages[2], {"q": "spam"})
+        self.assertIn('href="http://nohost/search?q=spam">1</a>', html)
+        self.assertIn(pages[2].nexturl({"q": "spam"}).replace("&", "&amp;"), html)
+        self.assertIn('<span class="page-link">3</span>', html)
+        self.assertNotIn("page-item last", html)
+        html = render_navigation(pages[-1], {})
+        self.assertIn('<span class="page-link">4</span>', html)
+        self.assertNotIn("page-item next", html)
+
+    def test_date_index(self):
+        # The DateIndex only has minutes, the metadata has seconds.
+        from DateTime import DateTime
+        from plone.base.batch import KeysetBatch
+        from Products.PluginIndexes.DateIndex.DateIndex import DateIndex
+
+        self.catalog.addIndex("modified", DateIndex("modified"))
+        self.catalog.addColumn("modified")
+        for second, uid in ((50, "x0"), (10, "x1"), (30, "x2"), (20, "x3")):
+            item = DummyItem(0, uid)
+            item.portal_type = "Event"
+            item.modified = DateTime(f"2024/01/01 10:00:{second} UTC")
+            self.catalog.catalog_object(item, uid)
+        query = {"portal_type": "Event"}
+        uids = []
+        cursor = None
+        while True:
+            batch = KeysetBatch(self.catalog, query, 1, "modified", cursor=cursor)
+            uids.extend(brain.UID for brain in batch)
+            cursor = batch.next_cursor
+            if cursor is None:
+                break
+        self.assertEqual(uids, ["x0", "x1", "x2", "x3"])
+
+
+class TestStreamingBatch(unittest.TestCase):
+    def tearDown(self):
+        tearDown()
+
+    def test_iterator(self):
+        from plone.base.batch import StreamingBatch
+
+        consumed = []
+
+        def items():
+            for number in range(100):
+                consumed.append(number)
+                yield number
+
+        batch = StreamingBatch(items(), size=10, start=30)
+        self.assertEqual(list(batch), list(range(30, 40)))
+        # Only up to one item past the page is fetched.
+        self.assertEqual(consumed[-1], 40)
+        self.assertEqual(batch.pagenumber, 4)
+        self.assertIsNone(batch.numpages)
+        self.assertTrue(batch.has_next)
+        self.assertTrue(batch.has_previous)
+        self.assertEqual(batch.navlist, range(1, 6))
+        self.assertListEqual(
+            list(batch.nexturls({})),
+            [(5, "b_start:int=40")],
+        )
+        self.assertEqual(
+            list(batch.prevurls({}))[-1],
+            (3, "b_start:int=20"),
+        )
+
+    def test_size_and_start_out_of_range(self):
+        from plone.base.batch import StreamingBatch
+
+        for size in (0, -1):
+            batch = StreamingBatch(iter(range(30)), size=size, start=25)
+            self.assertEqual(batch.pagesize, 25)
+            self.assertEqual(batch.pagenumber, 2)
+            self.assertEqual(list(batch), [25, 26, 27, 28, 29])
+        for sequence in (range(30), iter(range(30))):
+            batch = StreamingBatch(sequence, size=10, start=-5)
+            self.assertEqual(batch.start, 0)
+            self.assertEqual(batch.pagenumber, 1)
+            self.assertEqual(list(batch), list(range(10)))
+            self.assertFalse(batch.has_previous)
+
+    def test_last_page(self):
+        from plone.base.batch import StreamingBatch
+
+        batch = StreamingBatch(iter(range(25)), size=10, start=20, pagerange=2)
+        self.assertEqual(list(batch), [20, 21, 22, 23, 24])
+        self.assertFalse(batch.has_next)
+        self.assertEqual(batch.navlist, range(2, 4))
+        self.assertEqual(list(batch.nexturls({})), [])
+        self.assertTrue(batch.islastpage)
+        self.assertEqual(batch.next_item_count, 0)
+        batch = StreamingBatch(range(20), size=10, start=20)
+        self.assertFalse(batch)
+        self.assertEqual(batch.length, 0)
+
+    def test_navigation_template(self):
+        from plone.base.batch import StreamingBatch
+
+        batch = StreamingBatch(iter(range(100)), size=10, start=50, pagerange=3)
+        self.assertEqual(batch.navlist, range(5, 8))
+        self.assertEqual((batch.previouspage, batch.nextpage), (5, 7))
+        self.assertTrue(batch.show_link_to_first)
+        self.assertTrue(batch.second_page_not_in_navlist)
+        self.assertIsNone(batch.lastpage)
+        self.assertFalse(batch.show_link_to_last)
+        self.assertEqual(batch.next_item_count, 10)
+        html = render_navigation(batch, {"q": "spam"})
+        self.assertIn('href="http://nohost/search?q=spam&amp;b_start:int=0">1', html)
+        self.assertIn('href="http://nohost/search?q=spam&amp;b_start:int=60">7', html)
+        self.assertIn('<span class="page-link">6</span>', html)
+        self.assertNotIn("page-item last", html)
+        html = render_navigation(StreamingBatch(range(5), size=10), {})
+        self.assertNotIn("pagination", html)
+
+    def test_lazy_sequence(self):
+        from plone.base.batch import StreamingBatch
+
+        fetched = []
+
+        def get(key):
+            fetched.append(key)
+            return key
+
+        batch = StreamingBatch(LazyMap(get, range(1000)), size=10, start=500)
+        self.assertEqual(list(batch), list(range(500, 510)))
+        self.assertEqual(fetched, list(range(500, 511)))
+        self.assertEqual(batch.pageurl({"q": "x"}), "q=x&b_start:int=500")
+
+
+class TestCountCache(unittest.TestCase):
+    def tearDown(self):
+        from plone.base.batch import _result_counts
+
+        _result_counts.clear()
+
+    def test_query_fingerprint(self):
+        from plone.base.batch import query_fingerprint
+
+        self.assertEqual(
+            query_fingerprint(
+                {
+                    "portal_type": ["News Item", "Document"],
+                    "path": {"query": "/plone", "depth": 1},
+                    "sort_on": "modified",
+                    "b_start": 20,
+                }
+            ),
+            query_fingerprint(
+                {
+                    "path": {"depth": 1, "query": "/plone"},
+                    "portal_type": ("Document", "News Item"),
+                }
+            ),
+        )
+        self.assertNotEqual(
+            query_fingerprint({"portal_type": "Document"}),
+            query_fingerprint({"portal_type": "News Item"}),
+        )
+
+    def test_result_count_key(self):
+        from OFS.SimpleItem import SimpleItem
+        from plone.base.batch import result_count_key
+
+        class Catalog(SimpleItem):
+            id = "portal_catalog"
+            counter = 1
+
+            def getCounter(self):
+                return self.counter
+
+        catalog = Catalog()
+        query = {"portal_type": "Document"}
+        self.assertIsNone(result_count_key(SimpleItem(), {}, None))
+        key = result_count_key(catalog, query, None)
+        self.assertEqual(key, result_count_key(catalog, query, None))
+        # the same query, filtered differently afterwards
+        self.assertNotEqual(key, result_count_key(catalog, query, "recent"))
+        self.assertNotEqual(
+            result_count_key(catalog, query, ("recent", 7)),
+            result_count_key(catalog, query, ("recent", 30)),
+        )
+        catalog.counter += 1
+        self.assertNotEqual(key, result_count_key(catalog, query, None))
+
+    def test_batch_count_key(self):
+        from plone.base.batch import Batch
+
+        counted = []
+
+        class Sequence(list):
+            def __len__(self):
+                counted.append(1)
+                return super().__len__()
+
+        batch = Batch(Sequence(range(95)), size=10, start=80, count_key="key")
+        self.assertEqual(batch.sequence_length, 95)
+        self.assertEqual(batch.numpages, 10)
+        self.assertEqual(len(counted), 1)
+        # Another request for another page reuses the count.
+        batch = Batch(Sequence(range(95)), size=10, start=90, count_key="key")
+        self.assertEqual(batch.sequence_length, 95)
+        self.assertEqual(batch.length, 5)
+        self.assertEqual(len(counted), 1)
+
+    def test_batch_count_key_actual_result_count(self):
+        from plone.base.batch import _result_counts
+        from plone.base.batch import Batch
+
+        # The count of catalog results is used, not a cached one.
+        _result_counts["key"] = 50
+        sequence = LazyMap(lambda key: key, range(80, 90), actual_result_count=95)
+        batch = Batch(sequence, size=10, start=80, count_key="key")
+        self.assertEqual(batch.sequence_length, 95)
+        self.assertEqual(batch.numpages, 10)
+        self.assertEqual(_result_counts.get("key"), 50)
+
+
+class TestPrefetchObjects(unittest.TestCase):
+    def setUp(self):
+        from OFS.Application import Application
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+        from Products.BTreeFolder2.BTreeFolder2 import BTreeFolder2
+        from ZODB import DB
+
+        import transaction
+
+        self.db = DB(None)
+        connection = self.db.open()
+        root = connection.root()
+        app = root["Application"] = Application()
+        app._setObject("folder", Folder("folder"))
+        app._setObject("btree", BTreeFolder2("btree"))
+        for container in (app.folder, app.btree):
+            for id in ("one", "two"):
+                item = SimpleItem()
+                item.id = id
+                container._setObject(id, item)
+        transaction.commit()
+        connection.close()
+        # Start with empty caches
+        self.db.cacheMinimize()
+        self.connection = self.db.open()
+        self.app = self.connection.root()["Application"]
+
+    def tearDown(self):
+        import transaction
+
+        transaction.abort()
+        self.connection.close()
+        self.db.close()
+
+    def _brains(self, paths):
+        from Acquisition import Implicit
+
+        class DummyBrain(Implicit):
+            def __init__(self, path):
+                self.path = path
+
+            def getPath(self):
+                return self.path
+
+            def getObject(self):
+                return self.aq_parent.unrestrictedTraverse(self.path, None)
+
+        return [DummyBrain(path).__of__(self.app) for path in paths]
+
+    def test_prefetch_objects(self):
+        from plone.base.batch import Batch
+        from ZODB.Connection import Connection
+
+        brains = self._brains(
+            ["/folder/one", "/folder/two", "/btree/one", "/btree/missing", "/gone/x"]
+        )
+        batch = Batch(brains, size=10)
+        with patch.object(Connection, "prefetch") as prefetch:
+            objects = list(batch.objects())[:3]
+        self.assertEqual(prefetch.call_count, 1)
+        prefetched = prefetch.call_args[0][0]
+        self.assertEqual(
+            sorted(obj.getId() for obj in prefetched), ["one", "one", "two"]
+        )
+        self.assertEqual([obj.getId() for obj in objects[:3]], ["one", "two", "one"])
+
+    def test_prefetch_loaded_objects(self):
+        from plone.base.batch import prefetch_objects
+        from ZODB.Connection import Connection
+
+        self.app.folder.one.title
+        brains = self._brains(["/folder/one"])
+        with patch.object(Connection, "prefetch") as prefetch:
+            prefetch_objects(brains)
+        prefetch.assert_not_called()
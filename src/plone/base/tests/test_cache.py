@@ -0,0 +1,73 @@
+"""Unit tests for plone.base.cache module."""
+
+from unittest.mock import patch
+from zope.annotation.attribute import AttributeAnnotations
+from zope.annotation.interfaces import IAttributeAnnotatable
+from zope.component import provideAdapter
+from zope.component.testing import tearDown
+from zope.interface import alsoProvides
+from zope.publisher.browser import TestRequest
+
+import unittest
+
+
+class RequestCacheTests(unittest.TestCase):
+    def setUp(self):
+        provideAdapter(AttributeAnnotations)
+
+    def tearDown(self):
+        tearDown()
+
+    def test_request_cache(self):
+        from plone.base.cache import clear_request_cache
+        from plone.base.cache import get_request_cache
+
+        request = TestRequest()
+        alsoProvides(request, IAttributeAnnotatable)
+        cache = get_request_cache("test", request)
+        cache["key"] = "value"
+        self.assertIs(get_request_cache("test", request), cache)
+        self.assertEqual(get_request_cache("other", request), {})
+        clear_request_cache("test", request)
+        self.assertEqual(get_request_cache("test", request), {})
+
+    def test_request_cache_not_annotatable(self):
+        from plone.base.cache import get_request_cache
+
+        self.assertIsNone(get_request_cache("test", TestRequest()))
+
+    def test_request_cache_no_request(self):
+        from plone.base.cache import get_request_cache
+
+        self.assertIsNone(get_request_cache("test"))
+
+
+class LRUCacheTests(unittest.TestCase):
+    def test_maxsize(self):
+        from plone.base.cache import LRUCache
+
+        cache = LRUCache(maxsize=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        # "b" was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.pop("a"), 1)
+        self.assertIsNone(cache.pop("a"))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_ttl(self):
+        from plone.base.cache import LRUCache
+
+        cache = LRUCache(ttl=10)
+        with patch("time.monotonic", return_value=100):
+            cache["a"] = 1
+        with patch("time.monotonic", return_value=105):
+            self.assertEqual(cache.get("a"), 1)
+        with patch("time.monotonic", return_value=111):
+            self.assertEqual(cache.get("a", "gone"), "gone")
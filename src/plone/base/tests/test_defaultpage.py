@@ -0,0 +1,416 @@
+"""Unit tests for plone.base.defaultpage module."""
+
+from Acquisition import Implicit
+from Products.CMFCore.interfaces import IFolderish
+from unittest.mock import patch
+from zope.annotation.attribute import AttributeAnnotations
+from zope.annotation.interfaces import IAttributeAnnotatable
+from zope.component import provideAdapter
+from zope.component.testing import tearDown
+from zope.interface import alsoProvides
+from zope.interface import implementer
+from zope.publisher.browser import TestRequest
+
+import unittest
+
+
+@implementer(IFolderish)
+class DummyFolder(Implicit):
+    def __init__(self, id, ids=(), default_page=None):
+        self.id = id
+        self.ids = list(ids)
+        if default_page is not None:
+            self.default_page = default_page
+
+    def getId(self):
+        return self.id
+
+    def getPhysicalPath(self):
+        return ("", "plone", self.id)
+
+    def objectIds(self):
+        return list(self.ids)
+
+
+class DummyItem(Implicit):
+    def __init__(self, id):
+        self.id = id
+
+    def getId(self):
+        return self.id
+
+
+def make_request():
+    request = TestRequest()
+    alsoProvides(request, IAttributeAnnotatable)
+    return request
+
+
+class DefaultPageCacheTests(unittest.TestCase):
+    def setUp(self):
+        provideAdapter(AttributeAnnotations)
+
+    def tearDown(self):
+        tearDown()
+
+    def test_get_default_page_index_html(self):
+        from plone.base.defaultpage import get_default_page
+
+        folder = DummyFolder("folder", ids=["index_html", "other"])
+        self.assertEqual(get_default_page(folder), "index_html")
+
+    def test_get_default_page_not_folderish(self):
+        from plone.base.defaultpage import get_default_page
+
+        self.assertIsNone(get_default_page(DummyItem("item"), make_request()))
+
+    def test_get_default_page_memoized_per_request(self):
+        import plone.base.defaultpage
+
+        folder = DummyFolder("folder", ids=["index_html"])
+        request = make_request()
+        with patch.object(
+            plone.base.defaultpage,
+            "_get_default_page",
+            wraps=plone.base.defaultpage._get_default_page,
+        ) as lookup:
+            for _ in range(5):
+                self.assertEqual(
+                    plone.base.defaultpage.get_default_page(folder, request),
+                    "index_html",
+                )
+            self.assertEqual(lookup.call_count, 1)
+            # A new request does the lookup again.
+            plone.base.defaultpage.get_default_page(folder, make_request())
+            self.assertEqual(lookup.call_count, 2)
+
+    def test_get_default_page_memoizes_none(self):
+        import plone.base.defaultpage
+
+        folder = DummyFolder("folder", ids=["other"])
+        request = make_request()
+        with patch.object(
+            plone.base.defaultpage,
+            "_get_default_page",
+            wraps=plone.base.defaultpage._get_default_page,
+        ) as lookup:
+            self.assertIsNone(plone.base.defaultpage.get_default_page(folder, request))
+            self.assertIsNone(plone.base.defaultpage.get_default_page(folder, request))
+            self.assertEqual(lookup.call_count, 1)
+
+    def test_view_shares_cache(self):
+        import plone.base.defaultpage
+
+        folder = DummyFolder("folder", ids=["index_html"])
+        request = make_request()
+        view = plone.base.defaultpage.DefaultPageView(folder, request)
+        with patch.object(
+            plone.base.defaultpage,
+            "_get_default_page",
+            wraps=plone.base.defaultpage._get_default_page,
+        ) as lookup:
+            self.assertEqual(view.getDefaultPage(), "index_html")
+            self.assertTrue(view.isDefaultPage(DummyItem("index_html")))
+            self.assertFalse(view.isDefaultPage(DummyItem("other")))
+            self.assertTrue(
+                plone.base.defaultpage.is_default_page(
+                    folder, DummyItem("index_html"), request
+                )
+            )
+            self.assertEqual(lookup.call_count, 1)
+
+    def test_no_cache_without_annotatable_request(self):
+        import plone.base.defaultpage
+
+        folder = DummyFolder("folder", ids=["index_html"])
+        request = TestRequest()
+        with patch.object(
+            plone.base.defaultpage,
+            "_get_default_page",
+            wraps=plone.base.defaultpage._get_default_page,
+        ) as lookup:
+            plone.base.defaultpage.get_default_page(folder, request)
+            plone.base.defaultpage.get_default_page(folder, request)
+            self.assertEqual(lookup.call_count, 2)
+
+
+class ContainedIdsTests(unittest.TestCase):
+    def _make_folders(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+        from Products.BTreeFolder2.BTreeFolder2 import BTreeFolder2
+
+        folders = []
+        for factory in (Folder, BTreeFolder2):
+            folder = factory("folder")
+            folder.title = "A folder"
+            folder.default_page = "page"
+            for id in ("index_html", "page"):
+                item = SimpleItem()
+                item.id = id
+                folder._setObject(id, item)
+            folders.append(folder)
+        return folders
+
+    def test_contained_ids(self):
+        from plone.base.defaultpage import _ContainedIds
+
+        for folder in self._make_folders():
+            ids = _ContainedIds(folder)
+            self.assertIn("index_html", ids)
+            self.assertIn("page", ids)
+            self.assertNotIn("missing", ids)
+            # Attributes are not contained items
+            self.assertNotIn("title", ids)
+            self.assertNotIn("default_page", ids)
+            self.assertNotIn("_objects", ids)
+
+    def test_get_default_page_does_not_list_ids(self):
+        from plone.base.defaultpage import get_default_page
+
+        for folder in self._make_folders():
+            alsoProvides(folder, IFolderish)
+            with patch.object(
+                folder, "objectIds", side_effect=AssertionError("objectIds called")
+            ):
+                self.assertEqual(get_default_page(folder), "index_html")
+                folder._delObject("index_html")
+                # No site root registered, so we stop after the default_page
+                # attribute.
+                self.assertEqual(get_default_page(folder), "page")
+
+
+class BulkDefaultPageTests(unittest.TestCase):
+    def setUp(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+
+        self.root = Folder("plone")
+        for folder_id in ("a", "b"):
+            folder = Folder(folder_id)
+            alsoProvides(folder, IFolderish)
+            self.root._setObject(folder_id, folder)
+            folder = self.root[folder_id]
+            for id in ("index_html", "one", "two"):
+                item = SimpleItem()
+                item.id = id
+                folder._setObject(id, item)
+        self.root.b.default_page = "one"
+        self.root.b._delObject("index_html")
+
+    def test_get_default_pages(self):
+        from plone.base.defaultpage import get_default_pages
+
+        self.assertEqual(
+            get_default_pages([self.root.a, self.root.b, self.root.a]),
+            {"plone/a": "index_html", "plone/b": "one"},
+        )
+
+    def test_are_default_pages(self):
+        import plone.base.defaultpage
+
+        objs = [self.root.a[id] for id in self.root.a.objectIds()]
+        objs += [self.root.b[id] for id in self.root.b.objectIds()]
+        with patch.object(
+            plone.base.defaultpage,
+            "_get_default_page",
+            wraps=plone.base.defaultpage._get_default_page,
+        ) as lookup:
+            result = plone.base.defaultpage.are_default_pages(objs)
+            self.assertEqual(lookup.call_count, 2)
+        self.assertEqual(
+            result,
+            {
+                "plone/a/index_html": True,
+                "plone/a/one": False,
+                "plone/a/two": False,
+                "plone/b/one": True,
+                "plone/b/two": False,
+            },
+        )
+
+
+class DummyBrain:
+    def __init__(self, id, obj=None, **metadata):
+        self.getId = id
+        self._obj = obj
+        self.__dict__.update(metadata)
+
+    def getObject(self):
+        return self._obj
+
+
+class RecordedDefaultPageTests(unittest.TestCase):
+    def setUp(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+
+        self.folder = Folder("folder")
+        alsoProvides(self.folder, IFolderish)
+        for id in ("one", "two"):
+            item = SimpleItem()
+            item.id = id
+            self.folder._setObject(id, item)
+
+    def tearDown(self):
+        tearDown()
+
+    def test_record_default_page(self):
+        from plone.base.defaultpage import get_recorded_default_page
+        from plone.base.defaultpage import record_default_page
+
+        self.assertIsNone(get_recorded_default_page(self.folder))
+        record_default_page(self.folder)
+        self.assertEqual(get_recorded_default_page(self.folder), "")
+        self.folder.default_page = "two"
+        record_default_page(self.folder)
+        self.assertEqual(get_recorded_default_page(self.folder), "two")
+        # Not acquired by the items
+        self.assertIsNone(get_recorded_default_page(self.folder.one))
+
+    def test_record_default_page_reindex(self):
+        from plone.base.defaultpage import record_default_page
+        from unittest.mock import Mock
+
+        self.folder.reindexObject = Mock()
+        record_default_page(self.folder)
+        self.folder.reindexObject.assert_called_once_with(idxs=["getId"])
+        # Unchanged, so not reindexed again
+        record_default_page(self.folder)
+        self.assertEqual(self.folder.reindexObject.call_count, 1)
+
+    def test_subscriber_on_container_modified(self):
+        from OFS.SimpleItem import SimpleItem
+        from plone.base.defaultpage import get_recorded_default_page
+        from plone.base.defaultpage import update_recorded_default_page
+        from zope.component import provideHandler
+        from zope.component.event import objectEventNotify
+        from zope.lifecycleevent.interfaces import IObjectModifiedEvent
+
+        provideHandler(objectEventNotify)
+        provideHandler(update_recorded_default_page, (IFolderish, IObjectModifiedEvent))
+        item = SimpleItem()
+        item.id = "index_html"
+        self.folder._setObject("index_html", item)
+        self.assertEqual(get_recorded_default_page(self.folder), "index_html")
+        self.folder._delObject("index_html")
+        self.assertEqual(get_recorded_default_page(self.folder), "")
+
+    def test_default_page_from_brain(self):
+        from plone.base.defaultpage import get_default_page_from_brain
+        from plone.base.defaultpage import is_default_page_from_brain
+
+        self.folder.default_page = "one"
+        parent = DummyBrain("folder", default_page_id="two")
+        # The metadata wins, the object is not used.
+        self.assertEqual(get_default_page_from_brain(parent), "two")
+        self.assertTrue(is_default_page_from_brain(parent, DummyBrain("two")))
+        self.assertFalse(is_default_page_from_brain(parent, DummyBrain("one")))
+        parent = DummyBrain("folder", default_page_id="")
+        self.assertIsNone(get_default_page_from_brain(parent))
+        self.assertFalse(is_default_page_from_brain(parent, DummyBrain("one")))
+        # Fall back to the object if nothing was recorded.
+        parent = DummyBrain("folder", obj=self.folder)
+        self.assertEqual(get_default_page_from_brain(parent), "one")
+
+    def test_default_page_id_indexer(self):
+        from Missing import MV
+        from OFS.Folder import Folder
+        from plone.base.defaultpage import DefaultPageIdIndexer
+        from plone.base.defaultpage import get_default_page_from_brain
+        from plone.base.defaultpage import record_default_page
+
+        self.folder.default_page = "two"
+        record_default_page(self.folder)
+        self.assertEqual(DefaultPageIdIndexer(self.folder, None)(), "two")
+        # Nothing for items, and for containers with nothing recorded, like
+        # missing metadata.  Not acquired from the parent.
+        subfolder = Folder("sub")
+        alsoProvides(subfolder, IFolderish)
+        self.folder._setObject("sub", subfolder)
+        for obj in (self.folder.one, self.folder.sub):
+            with self.assertRaises(AttributeError):
+                DefaultPageIdIndexer(obj, None)()
+        self.folder.sub.default_page = "page"
+        self.folder.sub._setObject("page", Folder("page"))
+        parent = DummyBrain("sub", obj=self.folder.sub, default_page_id=MV)
+        self.assertEqual(get_default_page_from_brain(parent), "page")
+
+
+class PortalDefaultPageTests(unittest.TestCase):
+    def setUp(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+        from plone.base.defaultpage import _portal_pages
+        from plone.registry.interfaces import IRegistry
+        from Products.CMFCore.interfaces import ISiteRoot
+        from zope.component import provideUtility
+
+        _portal_pages.clear()
+        self.portal = Folder("plone")
+        item = SimpleItem()
+        item.id = "front-page"
+        self.portal._setObject("front-page", item)
+        self.folder = Folder("folder")
+        alsoProvides(self.folder, IFolderish)
+        self.portal._setObject("folder", self.folder)
+        self.folder = self.portal.folder
+        self.folder.default_page = ["missing", "front-page"]
+        provideUtility(self.portal, ISiteRoot)
+        provideUtility({"plone.default_page": []}, IRegistry)
+
+    def tearDown(self):
+        from plone.base.defaultpage import _portal_pages
+
+        _portal_pages.clear()
+        tearDown()
+
+    def test_portal_lookups_cached(self):
+        from OFS.Folder import Folder
+        from plone.base.defaultpage import _get_default_page
+
+        with patch.object(
+            Folder,
+            "unrestrictedTraverse",
+            autospec=True,
+            side_effect=Folder.unrestrictedTraverse,
+        ) as traverse:
+            self.assertEqual(_get_default_page(self.folder), "front-page")
+            self.assertEqual(traverse.call_count, 2)
+            self.assertEqual(_get_default_page(self.folder), "front-page")
+            self.assertEqual(traverse.call_count, 2)
+
+    def test_portal_lookups_cleared(self):
+        from plone.base.defaultpage import _get_default_page
+        from plone.base.defaultpage import clear_portal_default_pages
+
+        self.assertEqual(_get_default_page(self.folder), "front-page")
+        self.portal._delObject("front-page")
+        clear_portal_default_pages(self.portal, None)
+        self.assertIsNone(_get_default_page(self.folder))
+
+
+class ConfigurationTests(unittest.TestCase):
+    def tearDown(self):
+        tearDown()
+
+    def test_subscribers_registered(self):
+        from zope.component import getGlobalSiteManager
+        from zope.configuration import xmlconfig
+
+        import plone.base
+        import zope.component
+
+        context = xmlconfig.file("meta.zcml", zope.component)
+        xmlconfig.file("configure.zcml", plone.base, context=context)
+        handlers = {
+            registration.handler.__name__
+            for registration in getGlobalSiteManager().registeredHandlers()
+        }
+        self.assertTrue(
+            {
+                "update_recorded_default_page",
+                "clear_portal_default_pages",
+                "clear_formatstring_overrides",
+            }.issubset(handlers)
+        )
@@ -501,3 +501,211 @@ class BasicI18nl10nTests(unittest.TestCase):
         self.assertTrue(ulocalized_time(datetime.datetime.now()).startswith(day))
         self.assertTrue(ulocalized_time(86400).startswith("1970-01"))
         self.assertEqual(ulocalized_time("Jan 27 1976"), "1976-01-27T00:00:00")
+
+
+class FormatPlanTests(unittest.TestCase):
+    def setUp(self):
+        from zope.annotation.attribute import AttributeAnnotations
+        from zope.annotation.interfaces import IAttributeAnnotatable
+        from zope.component import provideAdapter
+        from zope.interface import alsoProvides
+
+        provideAdapter(AttributeAnnotations)
+        self.context = DummyContext()
+        alsoProvides(self.context.REQUEST, IAttributeAnnotatable)
+
+    def tearDown(self):
+        from zope.component.testing import tearDown
+
+        tearDown()
+
+    def test_plan_memoized_per_request(self):
+        import plone.base.i18nl10n
+
+        ulocalized_time = plone.base.i18nl10n.ulocalized_time
+        with patch_formatstring():
+            with patch_translate():
+                self.assertEqual(
+                    ulocalized_time(
+                        "Mar 9, 1997 1:45pm",
+                        context=self.context,
+                        target_language="nl",
+                    ),
+                    "NL: zo 09 mrt 1997",
+                )
+                # msgid, format string, weekday name and month name
+                calls = plone.base.i18nl10n.translate.call_count
+                self.assertEqual(calls, 4)
+                self.assertEqual(
+                    ulocalized_time(
+                        "Mar 16, 1997 1:45pm",
+                        context=self.context,
+                        target_language="nl",
+                    ),
+                    "NL: zo 16 mrt 1997",
+                )
+                self.assertEqual(plone.base.i18nl10n.translate.call_count, calls)
+                # Another language gets its own plan.
+                self.assertEqual(
+                    ulocalized_time(
+                        "Mar 9, 1997 1:45pm",
+                        context=self.context,
+                        target_language="de",
+                    ),
+                    "DE: 09.03.1997",
+                )
+                self.assertEqual(plone.base.i18nl10n.translate.call_count, calls + 2)
+
+    def test_plan_placeholders(self):
+        from plone.base.i18nl10n import ulocalized_time
+
+        # Unbraced placeholders are only filled in for the elements that are
+        # used braced as well, like zope.i18n.interpolate would.
+        with patch_formatstring():
+            self.assertEqual(
+                ulocalized_time(
+                    "Mar 9, 1997 1:45pm",
+                    long_format="${Y}/$Y $d ${H}$M $$Y $Yx",
+                    context=self.context,
+                ),
+                "1997/1997 $d 13$M $$Y $Yx",
+            )
+
+    def test_ulocalized_time_many(self):
+        import plone.base.i18nl10n
+
+        times = [
+            DateTime.DateTime("Mar 9, 1997 1:45pm"),
+            datetime.datetime(1997, 3, 16, 13, 45),
+            "Hello world",
+            "Mar 23, 1997",
+        ]
+        with patch_formatstring():
+            with patch_translate():
+                self.assertEqual(
+                    plone.base.i18nl10n.ulocalized_time_many(
+                        times, context=self.context, target_language="nl"
+                    ),
+                    [
+                        "NL: zo 09 mrt 1997",
+                        "NL: zo 16 mrt 1997",
+                        None,
+                        "NL: zo 23 mrt 1997",
+                    ],
+                )
+                self.assertEqual(plone.base.i18nl10n.translate.call_count, 4)
+        self.assertEqual(
+            plone.base.i18nl10n.ulocalized_time_many(["Jan 27 1976"]),
+            ["1976-01-27T00:00:00"],
+        )
+
+    def test_ulocalized_time_native(self):
+        import plone.base.i18nl10n
+
+        values = [
+            datetime.datetime(1997, 3, 9, 13, 45),
+            datetime.datetime(1997, 3, 9, 13, 45, tzinfo=datetime.timezone.utc),
+            857915100.0,
+            857915100,
+        ]
+        with patch_formatstring("${Y}-${m}-${d} ${H}:${M}:${S} ${p} ${Z}"):
+            expected = [
+                plone.base.i18nl10n.ulocalized_time(
+                    DateTime.DateTime(value), context=self.context
+                )
+                for value in values
+            ]
+            with patch.object(
+                plone.base.i18nl10n, "DateTime", side_effect=AssertionError
+            ):
+                for value, result in zip(values, expected):
+                    self.assertEqual(
+                        plone.base.i18nl10n.ulocalized_time(
+                            value, context=self.context
+                        ),
+                        result,
+                    )
+                self.assertEqual(
+                    plone.base.i18nl10n.ulocalized_time_many(
+                        values, context=self.context
+                    ),
+                    expected,
+                )
+
+
+class FormatstringOverrideTests(unittest.TestCase):
+    def setUp(self):
+        from plone.base.i18nl10n import _formatstring_overrides
+        from plone.registry.interfaces import IRegistry
+        from zope.component import provideUtility
+
+        _formatstring_overrides.clear()
+        self.registry = {}
+        provideUtility(self.registry, IRegistry)
+
+    def tearDown(self):
+        from plone.base.i18nl10n import _formatstring_overrides
+        from zope.component.testing import tearDown
+
+        _formatstring_overrides.clear()
+        tearDown()
+
+    def _notify(self, name):
+        from plone.base.i18nl10n import clear_formatstring_overrides
+        from plone.registry.events import RecordModifiedEvent
+        from plone.registry.field import TextLine
+        from plone.registry.record import Record
+
+        record = Record(TextLine())
+        record.__name__ = name
+        clear_formatstring_overrides(RecordModifiedEvent(record, None, None))
+
+    def test_snapshot_per_database(self):
+        from plone.base.i18nl10n import get_formatstring_from_registry
+        from plone.registry import Registry
+        from plone.registry.interfaces import IRegistry
+        from ZODB import DB
+        from zope.component import provideUtility
+
+        import transaction
+
+        root = "Products.CMFPlone.i18nl10n.override_dateformat."
+        self.addCleanup(transaction.abort)
+        registries = []
+        for name, enabled in (("one", True), ("two", False)):
+            db = DB(None, database_name=name)
+            self.addCleanup(db.close)
+            registry = db.open().root()["registry"] = Registry()
+            transaction.commit()
+            registry.records._values[root + "Enabled"] = enabled
+            registry.records._values[root + "time_format"] = name
+            registries.append(registry)
+        # The same oid in different databases
+        self.assertEqual(registries[0]._p_oid, registries[1]._p_oid)
+        provideUtility(registries[0], IRegistry)
+        self.assertEqual(get_formatstring_from_registry("time_format"), "one")
+        provideUtility(registries[1], IRegistry)
+        self.assertIsNone(get_formatstring_from_registry("time_format"))
+
+    def test_snapshot(self):
+        from plone.base.i18nl10n import get_formatstring_from_registry
+
+        root = "Products.CMFPlone.i18nl10n.override_dateformat."
+        self.registry[root + "date_format_short"] = "${d}.${m}.${Y}"
+        self.assertIsNone(get_formatstring_from_registry("date_format_short"))
+        self.registry[root + "Enabled"] = True
+        # Not read again until a record changes.
+        self.assertIsNone(get_formatstring_from_registry("date_format_short"))
+        self._notify("plone.other")
+        self.assertIsNone(get_formatstring_from_registry("date_format_short"))
+        self._notify(root + "Enabled")
+        self.assertEqual(
+            get_formatstring_from_registry("date_format_short"), "${d}.${m}.${Y}"
+        )
+        self.assertIsNone(get_formatstring_from_registry("time_format"))
+        self.registry[root + "date_format_short"] = "${Y}"
+        self.assertEqual(
+            get_formatstring_from_registry("date_format_short"), "${d}.${m}.${Y}"
+        )
+        self._notify(root + "date_format_short")
+        self.assertEqual(get_formatstring_from_registry("date_format_short"), "${Y}")
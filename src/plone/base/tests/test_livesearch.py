@@ -0,0 +1,169 @@
+"""Unit tests for plone.base.livesearch module."""
+
+from unittest.mock import patch
+from zope.component.testing import tearDown
+
+import unittest
+
+
+class DummyDocument:
+    def __init__(self, id, text, portal_type="Document"):
+        self.id = id
+        self.text = text
+        self.portal_type = portal_type
+
+    def getId(self):
+        return self.id
+
+    def SearchableText(self):
+        return self.text
+
+
+class DummyBrowserIdManager:
+    browser_id = "browser-1"
+
+    def getBrowserId(self, create=True):
+        return self.browser_id
+
+
+class LivesearchTests(unittest.TestCase):
+    def setUp(self):
+        from OFS.Folder import Folder
+        from plone.base.livesearch import _candidates
+        from plone.registry.interfaces import IRegistry
+        from Products.PluginIndexes.FieldIndex.FieldIndex import FieldIndex
+        from Products.ZCatalog.ZCatalog import ZCatalog
+        from Products.ZCTextIndex.Lexicon import CaseNormalizer
+        from Products.ZCTextIndex.Lexicon import Splitter
+        from Products.ZCTextIndex.ZCTextIndex import PLexicon
+        from Products.ZCTextIndex.ZCTextIndex import ZCTextIndex
+        from zope.component import provideUtility
+
+        class Catalog(ZCatalog):
+            counter = 0
+
+            def getCounter(self):
+                return self.counter
+
+        class Extra:
+            doc_attr = "SearchableText"
+            lexicon_id = "lexicon"
+            index_type = "Okapi BM25 Rank"
+
+        _candidates.clear()
+        self.registry = {"plone.enable_livesearch": True}
+        provideUtility(self.registry, IRegistry)
+        self.portal = Folder("plone")
+        self.portal.browser_id_manager = DummyBrowserIdManager()
+        self.portal._setObject("portal_catalog", Catalog("portal_catalog"))
+        self.catalog = self.portal.portal_catalog
+        self.catalog._setObject(
+            "lexicon", PLexicon("lexicon", "", Splitter(), CaseNormalizer())
+        )
+        self.catalog.addIndex(
+            "SearchableText",
+            ZCTextIndex("SearchableText", extra=Extra, caller=self.catalog),
+        )
+        self.catalog.addIndex("portal_type", FieldIndex("portal_type"))
+        self.catalog.addColumn("getId")
+        for id, text in (
+            ("one", "Spam and eggs"),
+            ("two", "Spam spamalot"),
+            ("three", "Spamming ham"),
+            ("four", "Eggs"),
+        ):
+            self.catalog.catalog_object(DummyDocument(id, text), id)
+        self.catalog.catalog_object(
+            DummyDocument("news", "Spam", portal_type="News Item"), "news"
+        )
+
+    def tearDown(self):
+        from AccessControl.SecurityManagement import noSecurityManager
+        from plone.base.livesearch import _candidates
+
+        _candidates.clear()
+        noSecurityManager()
+        tearDown()
+
+    def search(self, text, **query):
+        from plone.base.livesearch import livesearch
+
+        query.setdefault("portal_type", "Document")
+        return sorted(brain.getId for brain in livesearch(self.portal, text, **query))
+
+    def test_livesearch(self):
+        self.assertEqual(self.search("spam"), ["one", "three", "two"])
+        self.assertEqual(self.search("spam eg"), ["one"])
+        self.assertEqual(self.search("spam", portal_type="News Item"), ["news"])
+        self.assertEqual(self.search(""), [])
+        self.registry["plone.enable_livesearch"] = False
+        self.assertEqual(self.search("spam"), [])
+
+    def test_narrowing(self):
+        from Acquisition import aq_base
+
+        with patch.object(
+            type(aq_base(self.catalog)),
+            "searchResults",
+            wraps=self.catalog.searchResults,
+        ) as search:
+            self.assertEqual(self.search("spa"), ["one", "three", "two"])
+            self.assertEqual(search.call_count, 1)
+            self.assertEqual(self.search("spam"), ["one", "three", "two"])
+            self.assertEqual(self.search("spamm"), ["three"])
+            self.assertEqual(self.search("spamm h"), ["three"])
+            self.assertEqual(self.search("spamm ha"), ["three"])
+            self.assertEqual(search.call_count, 1)
+            # Not narrower, so the catalog is searched again.
+            self.assertEqual(self.search("spam"), ["one", "three", "two"])
+            self.assertEqual(search.call_count, 2)
+            self.assertEqual(self.search('spam "and"'), ["one"])
+            self.assertEqual(search.call_count, 3)
+            # Other criteria
+            self.assertEqual(self.search("spam", portal_type="News Item"), ["news"])
+            self.assertEqual(search.call_count, 4)
+            # A change in the catalog
+            self.catalog.counter += 1
+            self.assertEqual(self.search('spam "and" egg'), ["one"])
+            self.assertEqual(search.call_count, 5)
+
+    def test_narrowing_per_browser(self):
+        from Acquisition import aq_base
+
+        with patch.object(
+            type(aq_base(self.catalog)),
+            "searchResults",
+            wraps=self.catalog.searchResults,
+        ) as search:
+            self.assertEqual(self.search("spa"), ["one", "three", "two"])
+            self.portal.browser_id_manager.browser_id = "browser-2"
+            self.assertEqual(self.search("spam"), ["one", "three", "two"])
+            self.assertEqual(search.call_count, 2)
+            self.portal.browser_id_manager.browser_id = "browser-1"
+            self.assertEqual(self.search("spamm"), ["three"])
+            self.assertEqual(search.call_count, 2)
+
+    def test_narrowing_without_browser_id(self):
+        from AccessControl.SecurityManagement import newSecurityManager
+        from AccessControl.users import SimpleUser
+        from Acquisition import aq_base
+
+        self.portal.browser_id_manager.browser_id = None
+        with patch.object(
+            type(aq_base(self.catalog)),
+            "searchResults",
+            wraps=self.catalog.searchResults,
+        ) as search:
+            # Anonymous users cannot be told apart
+            self.assertEqual(self.search("spa"), ["one", "three", "two"])
+            self.assertEqual(self.search("spam"), ["one", "three", "two"])
+            self.assertEqual(search.call_count, 2)
+            # Authenticated users can
+            newSecurityManager(None, SimpleUser("bob", "", ["Member"], []))
+            self.assertEqual(self.search("spa"), ["one", "three", "two"])
+            self.assertEqual(self.search("spam"), ["one", "three", "two"])
+            self.assertEqual(search.call_count, 3)
+
+    def test_limit(self):
+        self.assertEqual(len(self.search("spam", limit=2)), 2)
+        self.assertEqual(self.search("spamm", limit=2), ["three"])
@@ -10,8 +10,15 @@ from Products.CMFCore.tests.base.testcase import SecurityTest
 from Products.CMFCore.tests.base.tidata import FTIDATA_DUMMY
 from Products.CMFCore.TypesTool import FactoryTypeInformation
 from Products.CMFCore.TypesTool import TypesTool
+from unittest.mock import patch
+from zope.annotation.interfaces import IAttributeAnnotatable
 from zope.component import getSiteManager
 from zope.component.interfaces import IFactory
+from zope.component.testing import tearDown
+from zope.interface import alsoProvides
+from zope.publisher.browser import TestRequest
+
+import unittest
 
 
 class PortalFolderFactoryTests(SecurityTest):
@@ -53,3 +60,177 @@ class PortalFolderFactoryTests(SecurityTest):
         navigation root is.
         """
         self.assertEqual(None, get_navigation_root_object(None, self.portal))
+
+
+class DummyURLTool:
+    def __init__(self, portal):
+        self.portal = portal
+
+    def getPortalObject(self):
+        return self.portal
+
+    def getPortalPath(self):
+        return "/".join(self.portal.getPhysicalPath())
+
+
+class DummyBrain:
+    def __init__(self, path):
+        self.path = path
+
+    def getPath(self):
+        return self.path
+
+
+class DummyCatalog:
+    def __init__(self, paths):
+        self.paths = paths
+        self.counter = 0
+        self.queries = 0
+
+    def getCounter(self):
+        return self.counter
+
+    def unrestrictedSearchResults(self, **query):
+        self.queries += 1
+        return [DummyBrain(path) for path in self.paths]
+
+
+class NavigationRootTests(unittest.TestCase):
+    def setUp(self):
+        from OFS.Folder import Folder
+        from plone.base.interfaces import INavigationRoot
+        from plone.base.navigationroot import _navigation_root_paths
+        from plone.registry.interfaces import IRegistry
+        from zope.annotation.attribute import AttributeAnnotations
+        from zope.component import provideAdapter
+        from zope.component import provideUtility
+        from zope.globalrequest import setRequest
+
+        _navigation_root_paths.clear()
+        self.portal = Folder("plone")
+        self.portal.portal_url = DummyURLTool(self.portal)
+        self.portal._setObject("subsite", Folder("subsite"))
+        alsoProvides(self.portal.subsite, INavigationRoot)
+        self.portal.subsite._setObject("folder", Folder("folder"))
+        self.portal._setObject("folder", Folder("folder"))
+        provideUtility({}, IRegistry)
+        provideAdapter(AttributeAnnotations)
+        self.request = TestRequest()
+        alsoProvides(self.request, IAttributeAnnotatable)
+        setRequest(self.request)
+
+    def tearDown(self):
+        from plone.base.navigationroot import _navigation_root_paths
+        from zope.globalrequest import clearRequest
+
+        _navigation_root_paths.clear()
+        clearRequest()
+        tearDown()
+
+    def test_walk_without_catalog(self):
+        from plone.base.navigationroot import get_navigation_root
+
+        self.assertEqual(get_navigation_root(self.portal.folder), "plone")
+        self.assertEqual(
+            get_navigation_root(self.portal.subsite.folder), "plone/subsite"
+        )
+        self.assertEqual(get_navigation_root(self.portal.subsite), "plone/subsite")
+        self.assertEqual(
+            get_navigation_root(self.portal.folder, relativeRoot="news"),
+            "plone/news",
+        )
+
+    def test_paths_from_catalog(self):
+        from plone.base.navigationroot import get_navigation_root
+        from plone.base.navigationroot import get_navigation_root_paths
+
+        catalog = self.portal.portal_catalog = DummyCatalog(["plone/subsite"])
+        self.assertEqual(
+            get_navigation_root_paths(self.portal),
+            frozenset(["plone", "plone/subsite"]),
+        )
+        with patch(
+            "plone.base.navigationroot.get_navigation_root_object",
+            side_effect=AssertionError("should not walk"),
+        ):
+            self.assertEqual(
+                get_navigation_root(self.portal.subsite.folder), "plone/subsite"
+            )
+            self.assertEqual(get_navigation_root(self.portal.folder), "plone")
+        self.assertEqual(catalog.queries, 1)
+        # A change in the catalog invalidates the paths
+        catalog.counter += 1
+        catalog.paths = []
+        self.assertEqual(get_navigation_root_paths(self.portal), frozenset(["plone"]))
+        self.assertEqual(catalog.queries, 2)
+
+    def test_unindexed_navigation_root(self):
+        from OFS.Folder import Folder
+        from plone.base.interfaces import INavigationRoot
+        from plone.base.navigationroot import get_navigation_root
+
+        self.portal.portal_catalog = DummyCatalog(["plone/subsite"])
+        # Marked, but not reindexed yet
+        alsoProvides(self.portal.folder, INavigationRoot)
+        self.portal.subsite.folder._setObject("sub", Folder("sub"))
+        alsoProvides(self.portal.subsite.folder.sub, INavigationRoot)
+        self.assertEqual(get_navigation_root(self.portal.folder), "plone/folder")
+        self.assertEqual(
+            get_navigation_root(self.portal.subsite.folder.sub),
+            "plone/subsite/folder/sub",
+        )
+        self.assertEqual(
+            get_navigation_root(self.portal.subsite.folder), "plone/subsite"
+        )
+
+    def test_memoized_per_request(self):
+        from plone.base.navigationroot import get_navigation_root
+        from plone.base.navigationroot import get_navigation_root_object
+
+        with patch(
+            "plone.base.navigationroot._get_navigation_root",
+            return_value="plone/cached",
+        ) as lookup:
+            get_navigation_root(self.portal.folder)
+            self.assertEqual(get_navigation_root(self.portal.folder), "plone/cached")
+            self.assertEqual(lookup.call_count, 1)
+        root = get_navigation_root_object(self.portal.subsite.folder, self.portal)
+        with patch("plone.base.navigationroot._get_navigation_root_object") as lookup:
+            self.assertIs(
+                get_navigation_root_object(self.portal.subsite.folder, self.portal),
+                root,
+            )
+            self.assertEqual(lookup.call_count, 0)
+
+    def test_from_path(self):
+        from plone.base.navigationroot import get_navigation_root_from_path
+
+        self.portal.portal_catalog = DummyCatalog(["plone/subsite"])
+        self.assertEqual(
+            get_navigation_root_from_path("plone/subsite/folder/doc", self.portal),
+            "plone/subsite",
+        )
+        self.assertEqual(
+            get_navigation_root_from_path(("plone", "folder"), self.portal),
+            "plone",
+        )
+        self.assertEqual(
+            get_navigation_root_from_path(
+                DummyBrain("plone/subsite/folder"), self.portal
+            ),
+            "plone/subsite",
+        )
+        self.assertEqual(
+            get_navigation_root_from_path(
+                "plone/subsite/folder", self.portal, relativeRoot="news"
+            ),
+            "plone/news",
+        )
+
+    def test_from_path_without_counter(self):
+        from plone.base.navigationroot import get_navigation_root_from_path
+
+        self.assertEqual(
+            get_navigation_root_from_path("subsite/folder", self.portal),
+            "plone/subsite",
+        )
@@ -1,10 +1,28 @@
 """Unit tests for utils module."""
 
 from plone.subrequest.interfaces import ISubRequest
+from unittest.mock import patch
 from zope.interface import alsoProvides
 
+import os
+import time
 import unittest
 
+
+def set_local_timezone(testcase, tz):
+    # Set the local time zone of the process until the end of the test.
+    def restore(tz):
+        if tz is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = tz
+        time.tzset()
+
+    testcase.addCleanup(restore, os.environ.get("TZ"))
+    os.environ["TZ"] = tz
+    time.tzset()
+
+
 SITE_LOGO_BASE64 = (
     b"filenameb64:cGl4ZWwucG5n;datab64:iVBORw0KGgoAAAANSUhEUgA"
     b"AAAEAAAABCAIAAACQd1PeAAAADElEQVQI12P4z8AAAAMBAQAY3Y2wAAA"
@@ -134,6 +152,69 @@ class DefaultUtilsTests(unittest.TestCase):
         ctx.vh_root = "/approot/PloneSite/folder/SubSite/en"
         self.assertEqual(get_top_site_from_url(ctx, req).id, "en")
 
+    def test_get_top_site_from_url_incremental(self):
+        """``get_top_site_from_url`` traverses one segment at a time and
+        memoizes the result in the request.
+        """
+        from plone.base.utils import get_top_site_from_url
+        from urllib.parse import urlparse
+        from zope.annotation.attribute import AttributeAnnotations
+        from zope.annotation.interfaces import IAttributeAnnotatable
+        from zope.component import provideAdapter
+        from zope.component.interfaces import ISite
+        from zope.component.testing import tearDown
+
+        traversals = []
+
+        class MockContext:
+            def __init__(self, physical_path):
+                self.physical_path = physical_path
+                if physical_path.split("/")[-1] in ("PloneSite", "SubSite"):
+                    alsoProvides(self, ISite)
+
+            @property
+            def id(self):
+                return self.physical_path.split("/")[-1]
+
+            def absolute_url(self):
+                return "http://nohost" + self.physical_path
+
+            def unrestrictedTraverse(self, path):
+                traversals.append(path)
+                if not path.startswith("/"):
+                    path = self.physical_path.rstrip("/") + "/" + path
+                return MockContext(path)
+
+            restrictedTraverse = unrestrictedTraverse
+
+        class MockRequest(dict):
+            def physicalPathFromURL(self, url):
+                return urlparse(url).path.rstrip("/").split("/")
+
+        provideAdapter(AttributeAnnotations)
+        self.addCleanup(tearDown)
+        request = MockRequest()
+        alsoProvides(request, IAttributeAnnotatable)
+        ctx = MockContext("/approot/PloneSite/folder/SubSite/folder")
+        self.assertEqual(get_top_site_from_url(ctx, request).id, "PloneSite")
+        # one traversal from the root, then one per segment, plus the final
+        # restricted traversal
+        self.assertEqual(
+            traversals,
+            [
+                "/",
+                "approot",
+                "PloneSite",
+                "folder",
+                "SubSite",
+                "folder",
+                "/approot/PloneSite",
+            ],
+        )
+        del traversals[:]
+        self.assertEqual(get_top_site_from_url(ctx, request).id, "PloneSite")
+        self.assertEqual(traversals, [])
+
     def test_human_readable_size_int(self):
         from plone.base.utils import human_readable_size
 
@@ -343,6 +424,424 @@ class DefaultUtilsTests(unittest.TestCase):
             _check_for_collision(container, "some_attr"),
         )
 
+    def test_check_ids(self):
+        from plone.base.utils import check_ids
+
+        class Container(dict):
+            def __getattribute__(self, name):
+                if name in self:
+                    return self[name]
+                return object.__getattribute__(self, name)
+
+            def portal_type(self):
+                """Necessary to fulfill protocol."""
+
+            def some_attr(self):
+                """Content with id some_attr should not be addable."""
+
+        container = Container()
+        container["test"] = Container()
+        result = check_ids(
+            container, ["test", "tiptop", "some_attr", "login", "", "tiptop"]
+        )
+        self.assertEqual(sorted(result), ["", "login", "some_attr", "test", "tiptop"])
+        self.assertIn("There is already an item named", result["test"])
+        self.assertIsNone(result["tiptop"])
+        self.assertIn("is reserved", result["some_attr"])
+        self.assertIn("is reserved", result["login"])
+        self.assertEqual(result[""], "Please enter a name.")
+
+    def test_reserve_id(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+        from plone.base.utils import _reserved_names
+        from plone.base.utils import reserve_id
+
+        import transaction
+
+        self.addCleanup(transaction.abort)
+        folder = Folder("folder")
+        item = SimpleItem()
+        item.id = "taken"
+        folder._setObject("taken", item)
+
+        self.assertEqual(reserve_id(folder, "doc"), "doc")
+        self.assertEqual(reserve_id(folder, "doc"), "doc-1")
+        self.assertEqual(reserve_id(folder, "taken"), "taken-1")
+        self.assertEqual(reserve_id(folder, "doc"), "doc-2")
+        self.assertEqual(
+            set(_reserved_names["folder"]), {"doc", "doc-1", "doc-2", "taken-1"}
+        )
+        # The reservations end with the transaction
+        transaction.abort()
+        self.assertNotIn("folder", _reserved_names)
+        self.assertEqual(reserve_id(folder, "doc"), "doc")
+        transaction.commit()
+        self.assertNotIn("folder", _reserved_names)
+
+    def test_reserve_id_other_connection(self):
+        from OFS.Folder import Folder
+        from OFS.SimpleItem import SimpleItem
+        from plone.base.utils import _reserved_names
+        from plone.base.utils import reserve_id
+        from transaction import TransactionManager
+        from ZODB import DB
+
+        self.addCleanup(_reserved_names.clear)
+        db = DB(None)
+        self.addCleanup(db.close)
+        tm1 = TransactionManager()
+        tm2 = TransactionManager()
+        self.addCleanup(tm1.abort)
+        self.addCleanup(tm2.abort)
+        conn1 = db.open(transaction_manager=tm1)
+        conn1.root()["folder"] = Folder("folder")
+        tm1.commit()
+        folder1 = conn1.root()["folder"]
+        # The transaction of the second connection starts before the commit.
+        conn2 = db.open(transaction_manager=tm2)
+        tm2.begin()
+        folder2 = conn2.root()["folder"]
+
+        self.assertEqual(reserve_id(folder1, "doc"), "doc")
+        item = SimpleItem()
+        item.id = "doc"
+        folder1._setObject("doc", item)
+        tm1.commit()
+        # The hooks are run by the transaction manager of the connection.
+        self.assertIsNotNone(_reserved_names["folder"]["doc"])
+        self.assertNotIn("doc", folder2.objectIds())
+        self.assertEqual(reserve_id(folder2, "doc"), "doc-1")
+        tm2.abort()
+        # Transactions that see the commit find the item itself.
+        self.assertEqual(reserve_id(folder2, "doc"), "doc-1")
+        tm2.abort()
+        self.assertEqual(reserve_id(folder1, "doc"), "doc-1")
+        tm1.abort()
+
+        # Committed ids expire
+        tm2.begin()
+        with patch("plone.base.utils.RESERVATION_GRACE", -1):
+            self.assertEqual(reserve_id(conn2.root()["folder"], "spam"), "spam")
+            tm2.commit()
+            self.assertEqual(_reserved_names, {})
+
+    def test_reserve_id_fails(self):
+        from OFS.Folder import Folder
+        from plone.base.utils import reserve_id
+
+        import transaction
+
+        self.addCleanup(transaction.abort)
+        with self.assertRaises(ValueError):
+            reserve_id(Folder("folder"), "login", max_tries=1)
+
+    def test_get_user_friendly_types(self):
+        from plone.base.utils import _user_friendly_types
+        from plone.base.utils import get_user_friendly_types
+        from plone.registry.interfaces import IRegistry
+        from Products.CMFCore.interfaces import ITypesTool
+        from Products.CMFCore.TypesTool import FactoryTypeInformation
+        from Products.CMFCore.TypesTool import TypesTool
+        from ZODB import DB
+        from zope.component import provideUtility
+        from zope.component.testing import tearDown
+
+        import transaction
+
+        self.addCleanup(tearDown)
+        self.addCleanup(_user_friendly_types.clear)
+        db = DB(None)
+        self.addCleanup(db.close)
+        conn = db.open()
+        self.addCleanup(transaction.abort)
+        ttool = conn.root()["portal_types"] = TypesTool()
+        for type_id in ("Document", "Folder", "Image"):
+            ttool._setObject(type_id, FactoryTypeInformation(type_id))
+        transaction.commit()
+        registry = {"plone.types_not_searched": ("Image",)}
+        provideUtility(registry, IRegistry)
+        provideUtility(ttool, ITypesTool)
+
+        self.assertEqual(sorted(get_user_friendly_types()), ["Document", "Folder"])
+        self.assertEqual(
+            get_user_friendly_types(["Image", "Folder", "Spam"]), ["Folder"]
+        )
+        with patch.object(TypesTool, "keys") as keys:
+            self.assertEqual(sorted(get_user_friendly_types()), ["Document", "Folder"])
+            keys.assert_not_called()
+
+        # Changing the setting or the types invalidates the cache
+        registry["plone.types_not_searched"] = ("Image", "Folder")
+        self.assertEqual(get_user_friendly_types(), ["Document"])
+        ttool._setObject("News Item", FactoryTypeInformation("News Item"))
+        self.assertEqual(sorted(get_user_friendly_types()), ["Document", "News Item"])
+        transaction.commit()
+        self.assertEqual(sorted(get_user_friendly_types()), ["Document", "News Item"])
+
+    def test_get_reserved_ids(self):
+        from plone.base.utils import _reserved_ids
+        from plone.base.utils import get_reserved_ids
+        from Products.PluginIndexes.FieldIndex.FieldIndex import FieldIndex
+        from Products.ZCatalog.ZCatalog import ZCatalog
+        from ZODB import DB
+
+        import transaction
+
+        db = DB(None)
+        self.addCleanup(db.close)
+        conn = db.open()
+        self.addCleanup(transaction.abort)
+        root = conn.root()
+        catalog = root["catalog"] = ZCatalog("portal_catalog")
+        catalog.addIndex("getId", FieldIndex("getId"))
+        catalog.addColumn("Title")
+
+        # Not committed yet: computed, but not cached.
+        reserved = get_reserved_ids(catalog)
+        self.assertIn("getId", reserved)
+        self.assertIn("Title", reserved)
+        self.assertIn("login", reserved)
+        self.assertNotIn("spam", reserved)
+        self.assertEqual(len(_reserved_ids), 0)
+
+        transaction.commit()
+        self.assertEqual(get_reserved_ids(catalog), reserved)
+        self.assertEqual(len(_reserved_ids), 1)
+        with patch.object(ZCatalog, "indexes") as indexes:
+            self.assertEqual(get_reserved_ids(catalog), reserved)
+            indexes.assert_not_called()
+
+        # Adding an index changes the catalog and thus the reserved ids.
+        catalog.addIndex("spam", FieldIndex("spam"))
+        self.assertIn("spam", get_reserved_ids(catalog))
+        transaction.commit()
+        self.assertIn("spam", get_reserved_ids(catalog))
+        catalog.delColumn("Title")
+        transaction.commit()
+        self.assertNotIn("Title", get_reserved_ids(catalog))
+        _reserved_ids.clear()
+
+    def test_get_reserved_ids_other_connection(self):
+        from plone.base.utils import _reserved_ids
+        from plone.base.utils import get_reserved_ids
+        from Products.PluginIndexes.FieldIndex.FieldIndex import FieldIndex
+        from Products.ZCatalog.ZCatalog import ZCatalog
+        from transaction import TransactionManager
+        from ZODB import DB
+
+        self.addCleanup(_reserved_ids.clear)
+        db = DB(None)
+        self.addCleanup(db.close)
+        tm1 = TransactionManager()
+        tm2 = TransactionManager()
+        self.addCleanup(tm1.abort)
+        self.addCleanup(tm2.abort)
+        conn1 = db.open(transaction_manager=tm1)
+        catalog1 = conn1.root()["catalog"] = ZCatalog("portal_catalog")
+        catalog1.addIndex("getId", FieldIndex("getId"))
+        tm1.commit()
+
+        conn2 = db.open(transaction_manager=tm2)
+        catalog2 = conn2.root()["catalog"]
+        self.assertNotIn("foo", get_reserved_ids(catalog2))
+        self.assertNotIn("foo", get_reserved_ids(catalog2))
+
+        # A change committed by another connection, or ZEO client,
+        # invalidates the catalog of this connection.
+        catalog1.addIndex("foo", FieldIndex("foo"))
+        tm1.commit()
+        tm2.begin()
+        self.assertIn("foo", get_reserved_ids(catalog2))
+        # Catalogs that were not loaded yet do not share a key.
+        conn3 = db.open(transaction_manager=TransactionManager())
+        self.assertIn("foo", get_reserved_ids(conn3.root()["catalog"]))
+
+    def test_is_expired(self):
+        from DateTime import DateTime
+        from plone.base.utils import is_expired
+
+        import datetime
+        import time
+
+        class Dummy:
+            def __init__(self, expires):
+                self.expires = expires
+
+        past = [
+            "2000-01-01T00:00:00+01:00",
+            "2000-01-01 00:00:00",
+            "2000/01/01 00:00:00 GMT+1",
+            datetime.datetime(2000, 1, 1),
+            datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc),
+            946681200.0,
+            lambda: "2000-01-01T00:00:00+01:00",
+        ]
+        future = [
+            "2999-01-01T00:00:00+01:00",
+            "2999/01/01 00:00:00 GMT+1",
+            datetime.datetime(2999, 1, 1, tzinfo=datetime.timezone.utc),
+            time.time() + 3600,
+            "None",
+            None,
+        ]
+        parsed = []
+
+        class CountingDateTime(DateTime):
+            def __init__(self, *args):
+                parsed.append(args)
+                super().__init__(*args)
+
+        with patch("plone.base.utils.DateTime", CountingDateTime):
+            for expires in past:
+                self.assertEqual(is_expired(Dummy(expires)), 1, expires)
+            for expires in future:
+                self.assertEqual(is_expired(Dummy(expires)), 0, expires)
+        # Only the strings that are not ISO formatted are parsed by DateTime.
+        self.assertEqual(len(parsed), 2)
+        self.assertEqual(is_expired(Dummy(DateTime("2000/01/01"))), 1)
+        self.assertEqual(is_expired(Dummy(DateTime("2999/01/01"))), 0)
+
+    @unittest.skipUnless(hasattr(time, "tzset"), "needs time.tzset")
+    def test_is_expired_naive_iso_string(self):
+        from DateTime import DateTime
+        from plone.base.utils import is_expired
+
+        import datetime
+
+        class Dummy:
+            def __init__(self, expires):
+                self.expires = expires
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        past = (now - datetime.timedelta(hours=2)).isoformat(" ", "seconds")
+        future = (now + datetime.timedelta(hours=2)).isoformat(" ", "seconds")
+        for tz in ("America/New_York", "Asia/Tokyo"):
+            set_local_timezone(self, tz)
+            # Naive ISO strings are UTC, like DateTime reads them.
+            self.assertTrue(DateTime(past).isPast())
+            self.assertEqual(is_expired(Dummy(past)), 1, tz)
+            self.assertFalse(DateTime(future).isPast())
+            self.assertEqual(is_expired(Dummy(future)), 0, tz)
+
+    def test_iter_listing_rows(self):
+        from DateTime import DateTime
+        from plone.base.utils import iter_listing_rows
+        from zope.publisher.browser import TestRequest
+
+        class DummyBrain:
+            portal_type = "Document"
+            review_state = "published"
+
+            def __init__(self, id, **metadata):
+                self.getId = id
+                self.__dict__.update(metadata)
+
+            def getURL(self):
+                return "http://nohost/plone/" + (self.getId or "")
+
+        brains = [
+            DummyBrain(
+                "one",
+                Title="One",
+                modified=DateTime("2023-01-02 10:00"),
+                ExpirationDate="2000-01-01T00:00:00+01:00",
+                getObjSize=2048,
+            ),
+            DummyBrain(
+                "two", Title="", modified=None, ExpirationDate="None", expires=None
+            ),
+            DummyBrain(None, Title=None, created=1699963200.0),
+        ]
+        with patch(
+            "plone.base.i18nl10n.get_formatstring_from_registry",
+            return_value="${Y}-${m}-${d}",
+        ):
+            rows = list(
+                iter_listing_rows(
+                    None,
+                    brains,
+                    date_fields=("modified", "created"),
+                    request=TestRequest(),
+                )
+            )
+        self.assertEqual([row["brain"] for row in rows], brains)
+        self.assertEqual([row["title"] for row in rows], ["One", "two", "[···]"])
+        self.assertEqual(
+            [row["url"] for row in rows],
+            [
+                "http://nohost/plone/one",
+                "http://nohost/plone/two",
+                "http://nohost/plone/",
+            ],
+        )
+        self.assertEqual([row["expired"] for row in rows], [True, False, False])
+        self.assertEqual([row["size"] for row in rows], ["2.0 KB", "0 KB", "0 KB"])
+        self.assertEqual([row["modified"] for row in rows], ["2023-01-02", None, None])
+        self.assertEqual(rows[2]["created"], "2023-11-14")
+        self.assertEqual(rows[0]["review_state"], "published")
+
+    def test_expiry_masks(self):
+        from DateTime import DateTime
+        from plone.base.utils import expired_mask
+        from plone.base.utils import get_timestamps
+        from plone.base.utils import visible_mask
+
+        import datetime
+        import math
+
+        class Dummy:
+            def __init__(self, **kw):
+                self.__dict__.update(kw)
+
+        items = [
+            Dummy(effective=DateTime("2000/01/01 UTC"), expires=3000.0),
+            Dummy(
+                effective=lambda: "2000-01-01T00:00:00+00:00",
+                expires=datetime.datetime(2999, 1, 1, tzinfo=datetime.timezone.utc),
+            ),
+            Dummy(effective=5000, expires="None"),
+            Dummy(expires="not a date"),
+        ]
+        effective = get_timestamps(items, "effective")
+        expires = get_timestamps(items, "expires")
+        self.assertEqual(effective[:3].tolist(), [946684800.0, 946684800.0, 5000.0])
+        self.assertTrue(math.isnan(effective[3]))
+        self.assertEqual(expires[:2].tolist(), [3000.0, 32472144000.0])
+        self.assertTrue(math.isnan(expires[2]))
+        self.assertEqual(expired_mask(expires, now=1e9), [True, False, False, False])
+        self.assertEqual(
+            visible_mask(effective, expires, now=1000.0), [False, False, False, True]
+        )
+        self.assertEqual(visible_mask(effective, expires), [False, True, True, True])
+
+    @unittest.skipUnless(hasattr(time, "tzset"), "needs time.tzset")
+    def test_expiry_masks_naive_iso_string(self):
+        from plone.base.utils import expired_mask
+        from plone.base.utils import get_timestamps
+        from plone.base.utils import is_expired
+
+        import datetime
+
+        class Dummy:
+            def __init__(self, expires):
+                self.expires = expires
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        items = [
+            Dummy((now + datetime.timedelta(hours=hours)).isoformat(" ", "seconds"))
+            for hours in (-2, 2)
+        ]
+        for tz in ("America/New_York", "Asia/Tokyo"):
+            set_local_timezone(self, tz)
+            self.assertEqual(
+                expired_mask(get_timestamps(items, "expires")),
+                [bool(is_expired(item)) for item in items],
+            )
+            self.assertEqual(
+                expired_mask(get_timestamps(items, "expires")), [True, False]
+            )
+
     def test_munge_search_term(self):
         from plone.base.utils import BAD_CHARS
         from plone.base.utils import munge_search_term
@@ -421,3 +920,41 @@ class DefaultUtilsTests(unittest.TestCase):
 
         for _in, _out in search_term_tests:
             self.assertEqual(munge_search_term(_in), _out)
+
+    def test_munge_search_term_ambiguous_quotes(self):
+        from plone.base.utils import munge_search_term
+
+        # Removing a phrase also removes matching text between other quotes.
+        self.assertEqual(
+            munge_search_term('"a" "x"a"y"'), '"a" AND "x" AND "y" AND "xy"'
+        )
+        self.assertEqual(munge_search_term('"""a""b"'), '"a" AND "b" AND "ab"')
+        self.assertEqual(munge_search_term('"a" "a" b'), '"a" AND "a" AND b*')
+
+    def test_tokenize_search_term(self):
+        from plone.base.utils import _search_tokens
+        from plone.base.utils import tokenize_search_term
+
+        import plone.base.utils
+
+        _search_tokens.clear()
+        self.assertEqual(
+            tokenize_search_term('spam "ham and eggs" or'),
+            ('"ham and eggs"', "spam*", '"or"'),
+        )
+        self.assertEqual(tokenize_search_term("spam-ham"), ("spam*", "ham*"))
+        with patch.object(
+            plone.base.utils,
+            "_search_terms",
+            wraps=plone.base.utils._search_terms,
+        ) as search_terms:
+            self.assertEqual(tokenize_search_term("spam ham"), ("spam*", "ham*"))
+            # cached, same query after removing bad characters
+            self.assertEqual(tokenize_search_term("spam-ham"), ("spam*", "ham*"))
+            self.assertEqual(search_terms.call_count, 0)
+            # Only the new term is munged.
+            self.assertEqual(
+                tokenize_search_term("spam ham eggs "), ("spam*", "ham*", "eggs*")
+            )
+            search_terms.assert_called_once_with(" eggs ")
+        _search_tokens.clear()
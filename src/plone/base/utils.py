@@ -1,11 +1,19 @@
 from . import PloneMessageFactory as _
+from .cache import get_request_cache
+from .cache import LRUCache
+from .i18nl10n import _get_format_plan
+from .i18nl10n import _to_local_time
 from .interfaces import ISearchSchema
 from AccessControl import getSecurityManager
 from AccessControl import Unauthorized
 from Acquisition import aq_base
 from Acquisition import aq_get
 from Acquisition import aq_parent
+from array import array
+from datetime import datetime
+from datetime import timezone
 from DateTime import DateTime
+from functools import cached_property
 from plone.registry.interfaces import IRegistry
 from Products.CMFCore.interfaces import ITypesTool
 from Products.CMFCore.permissions import AddPortalContent
@@ -22,7 +30,10 @@ from zope.i18n import translate
 from zope.publisher.interfaces.browser import IBrowserRequest
 
 import logging
+import math
 import re
+import threading
+import time
 import transaction
 
 logger = logging.getLogger("Plone")
@@ -38,6 +49,28 @@ SIZE_ORDER = ("PB", "TB", "GB", "MB", "KB")
 
 _marker = dict()
 
+# Ids which can never be used for content
+RESERVED_IDS = frozenset(("login", "layout", "plone", "zip", "properties"))
+
+# RESERVED_IDS plus the catalog indexes and metadata columns, keyed by the
+# path and serial of the catalog.
+_reserved_ids = LRUCache(maxsize=50)
+
+# The user friendly types, keyed by the path and serial of the types tool
+# and the types_not_searched setting.
+_user_friendly_types = LRUCache(maxsize=50)
+
+# Ids handed out by reserve_id in this process, keyed by the path of the
+# container.  The value is None while the transaction is in progress, and
+# the serial of the container and the time after it committed.
+_reserved_names = {}
+_reserved_names_lock = threading.Lock()
+
+# Seconds a committed id stays reserved for transactions that started
+# before the commit and do not see the new item yet.
+RESERVATION_GRACE = 300
+_reserved_names_pruned = [0.0]
+
 
 def human_readable_size(size):
     """Get a human readable size string."""
@@ -203,7 +236,10 @@ def get_installer(context, request=None):
 
 def is_expired(content):
     """Find out if the object is expired (copied from skin script)"""
+    return _is_past(_get_expiry(content), time.time())
+
 
+def _get_expiry(content):
     expiry = None
 
     # NOTE: We also accept catalog brains as 'content' so that the
@@ -225,15 +261,146 @@ def is_expired(content):
     if safe_callable(expiry):
         expiry = expiry()
 
-    # Convert to DateTime if necessary, ExpirationDate may return 'None'
+    # Convert date strings.  ExpirationDate may return 'None'
     if expiry and expiry != "None" and isinstance(expiry, str):
-        expiry = DateTime(expiry)
+        expiry = _parse_date(expiry)
+    return expiry
 
-    if isinstance(expiry, DateTime) and expiry.isPast():
+
+def _parse_date(value):
+    # Parse a date string like DateTime does, but ISO strings without the
+    # slower DateTime parser.  Like DateTime, naive ISO strings are UTC.
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return DateTime(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _is_past(expiry, now):
+    # Returns 1 if expiry is a datetime, DateTime or timestamp before now,
+    # which is a timestamp.
+    if isinstance(expiry, datetime):
+        if expiry.tzinfo is None:
+            # naive datetime objects are local time
+            return int(expiry.timestamp() < now)
+        return int(expiry < datetime.fromtimestamp(now, timezone.utc))
+    # a timestamp, for example from catalog metadata
+    if isinstance(expiry, (int, float)) and not isinstance(expiry, bool):
+        return int(expiry < now)
+    if isinstance(expiry, DateTime) and expiry.timeTime() < now:
         return 1
     return 0
 
 
+def get_timestamps(items, name):
+    """Return an array('d') with the timestamps in attribute ``name``.
+
+    ``items`` are usually catalog brains, and ``name`` a metadata column like
+    ``expires`` or ``effective``.  The values can be DateTime or datetime
+    objects, timestamps or date strings; methods are called.  Items without a
+    value, or a value that is not a date, get NaN.
+    """
+    timestamps = array("d")
+    append = timestamps.append
+    for item in items:
+        value = getattr(item, name, None)
+        if safe_callable(value):
+            value = value()
+        append(_to_timestamp(value))
+    return timestamps
+
+
+def _to_timestamp(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if value and value != "None" and isinstance(value, str):
+        try:
+            value = _parse_date(value)
+        except Exception:
+            return math.nan
+    if isinstance(value, DateTime):
+        return value.timeTime()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return math.nan
+
+
+def expired_mask(expires, now=None):
+    """Return a list of booleans telling which expiration times are past.
+
+    ``expires`` is a sequence of timestamps, like the result of
+    get_timestamps.  NaN means no expiration date.  ``now`` defaults to the
+    current time.
+    """
+    if now is None:
+        now = time.time()
+    return [expiry < now for expiry in expires]
+
+
+def visible_mask(effective, expires, now=None):
+    """Return a list of booleans telling which items are effective and not
+    expired.
+
+    ``effective`` and ``expires`` are sequences of timestamps of the same
+    length, like the results of get_timestamps.  NaN means no date set.
+    """
+    if now is None:
+        now = time.time()
+    return [not start > now and not end < now for start, end in zip(effective, expires)]
+
+
+def iter_listing_rows(
+    context, brains, date_fields=("modified",), long_format=False, request=None
+):
+    """Yield a dictionary with the data to show for each brain in a listing.
+
+    The rows have the brain and its ``id``, ``title`` (as in
+    pretty_title_or_id), ``url``, ``portal_type``, ``review_state``,
+    ``expired`` (as in is_expired) and ``size`` (as in human_readable_size),
+    plus each of ``date_fields`` localized with ulocalized_time.
+
+    The request, the title for items without title or id, the current time
+    and the date format are looked up once, before the first row.
+    """
+    if request is None:
+        request = aq_get(context, "REQUEST", None)
+    empty_title = get_empty_title(request)
+    now = time.time()
+    if long_format:
+        msgid = "date_format_long"
+    else:
+        msgid = "date_format_short"
+    plan = _get_format_plan(msgid, long_format, "plonelocales", request, None)
+
+    for brain in brains:
+        title = getattr(brain, "Title", None)
+        if safe_callable(title):
+            title = title()
+        item_id = getattr(brain, "getId", None)
+        if safe_callable(item_id):
+            item_id = item_id()
+        row = {
+            "brain": brain,
+            "id": item_id,
+            "title": title or (item_id if item_id is not None else empty_title),
+            "url": brain.getURL(),
+            "portal_type": getattr(brain, "portal_type", None),
+            "review_state": getattr(brain, "review_state", None),
+            "expired": bool(_is_past(_get_expiry(brain), now)),
+            "size": human_readable_size(getattr(brain, "getObjSize", None)),
+        }
+        for name in date_fields:
+            value = getattr(brain, name, None)
+            if safe_callable(value):
+                value = value()
+            value = _to_local_time(value) if value else None
+            row[name] = plan.format(value, request) if value is not None else None
+        yield row
+
+
 def get_top_request(request):
     """Get highest request from a subrequest."""
 
@@ -262,6 +429,9 @@ def get_top_site_from_url(context, request):
     the PloneSiteRoot.  Finally, if the virtual hosting environment points to
     a *child* of a site/subsite, that child returns instead of the site/subsite.
 
+    The URL path is traversed one segment at a time, and the result is
+    memoized per virtual hosting root and URL for the lifetime of the request.
+
     For this given content structure:
 
     /Plone/Subsite:
@@ -301,6 +471,17 @@ def get_top_site_from_url(context, request):
        so it must return the topmost visible container, since the callees
        need an object with a valid, TTW-visible URL to do their work.)
     """
+    cache = get_request_cache("topsite", request)
+    if cache is not None:
+        key = (request.get("VirtualRootPhysicalPath"), context.absolute_url())
+        site = cache.get(key, None)
+        if site is None:
+            site = cache[key] = _get_top_site_from_url(context, request)
+        return site
+    return _get_top_site_from_url(context, request)
+
+
+def _get_top_site_from_url(context, request):
     site = getSite()
     try:
         # This variable collects all sites found during the traversal that
@@ -311,19 +492,28 @@ def get_top_site_from_url(context, request):
         # during the traversal.
         topmosts = []
         url_path = urlparse(context.absolute_url()).path.split("/")
+        # The last object found and its physical path.  Each URL path
+        # usually extends the previous one by one segment, so we traverse
+        # from there instead of from the root again.
+        obj = obj_path = None
         for idx in range(len(url_path)):
             _path = "/".join(url_path[: idx + 1]) or "/"
-            site_path = "/".join(request.physicalPathFromURL(_path)) or "/"
-            # The following line is fine.  We do a restrictedTraverse
+            physical_path = tuple(request.physicalPathFromURL(_path))
+            # The following lines are fine.  We do a restrictedTraverse
             # below to resolve the actual object, so the user (technically,
             # the browser) cannot ever get a reference to an object it does
             # not have permission to.
             try:
-                _site = context.unrestrictedTraverse(site_path)
+                if obj is not None and physical_path[: len(obj_path)] == obj_path:
+                    rest = physical_path[len(obj_path) :]
+                    _site = obj.unrestrictedTraverse("/".join(rest)) if rest else obj
+                else:
+                    _site = context.unrestrictedTraverse("/".join(physical_path) or "/")
             except NotFound:
                 # Oh.  This path is not findable.  So we will not consider
                 # it below as a thing we can return to stand in for ISite.
                 continue
+            obj, obj_path = _site, physical_path
             if ISite.providedBy(_site):
                 subsites.append(idx)
             else:
@@ -389,10 +579,7 @@ def check_id(
     """
 
     def xlate(message):
-        ts = getToolByName(context, "translation_service", None)
-        if ts is None:
-            return message
-        return ts.translate(message, context=context.REQUEST)
+        return _translate_message(context, message)
 
     # if an alternative id has been supplied, see if we need to use it
     if alternative_id and not id:
@@ -415,37 +602,9 @@ def check_id(
     #
     # do basic id validation
     #
-
-    # check for reserved names
-    if id in (
-        "login",
-        "layout",
-        "plone",
-        "zip",
-        "properties",
-    ):
-        return xlate(_("${name} is reserved.", mapping={"name": id}))
-
-    # check for bad characters
-    plone_utils = getToolByName(context, "plone_utils", None)
-    if plone_utils is not None:
-        bad_chars = plone_utils.bad_chars(id)
-        if len(bad_chars) > 0:
-            bad_chars = "".join(bad_chars).decode("utf-8")
-            decoded_id = id.decode("utf-8")
-            return xlate(
-                _(
-                    "${name} is not a legal name. The following characters are "
-                    "invalid: ${characters}",
-                    mapping={"name": decoded_id, "characters": bad_chars},
-                )
-            )
-
-    # check for a catalog index
-    portal_catalog = getToolByName(context, "portal_catalog", None)
-    if portal_catalog is not None:
-        if id in list(portal_catalog.indexes()) + list(portal_catalog.schema()):
-            return xlate(_("${name} is reserved.", mapping={"name": id}))
+    result = _check_id_basics(context, id)
+    if result is not None:
+        return xlate(result)
 
     # id is good; decide if we should check for id collisions
     if contained_by is not None:
@@ -482,6 +641,218 @@ def check_id(
     return result
 
 
+def _translate_message(context, message):
+    ts = _get_tool(context, "translation_service")
+    if ts is None:
+        return message
+    return ts.translate(message, context=context.REQUEST)
+
+
+def _check_id_basics(context, id):
+    """Check an id for reserved names and bad characters.
+
+    Returns an untranslated error message or None if the id is good.
+    """
+    # check for reserved names
+    if id in RESERVED_IDS:
+        return _("${name} is reserved.", mapping={"name": id})
+
+    # check for bad characters
+    plone_utils = _get_tool(context, "plone_utils")
+    if plone_utils is not None:
+        bad_chars = plone_utils.bad_chars(id)
+        if len(bad_chars) > 0:
+            bad_chars = "".join(bad_chars).decode("utf-8")
+            decoded_id = id.decode("utf-8")
+            return _(
+                "${name} is not a legal name. The following characters are "
+                "invalid: ${characters}",
+                mapping={"name": decoded_id, "characters": bad_chars},
+            )
+
+    # check for a catalog index
+    portal_catalog = _get_tool(context, "portal_catalog")
+    if portal_catalog is not None:
+        if id in get_reserved_ids(portal_catalog):
+            return _("${name} is reserved.", mapping={"name": id})
+
+
+def check_ids(container, ids, **kwargs):
+    """Test many ids for new items in one container.
+
+    Does the same checks as check_id with ``contained_by=container`` and
+    ``required=True`` for each id, but everything that only depends on the
+    container (method aliases, permissions, portal contents) is computed
+    once.  Use this when creating many items in one folder.
+
+    Returns a dictionary mapping each id to a (translated) error message,
+    or None if the id is good.
+    """
+    checker = _CollisionChecker(container)
+    result = {}
+    for id in ids:
+        if id in result:
+            continue
+        if not id:
+            message = _("Please enter a name.")
+        else:
+            message = _check_id_basics(container, id)
+        if message is None:
+            try:
+                message = checker.check(id, **kwargs)
+            except Unauthorized:
+                message = _("${name} is reserved.", mapping={"name": id})
+        if message is not None:
+            message = _translate_message(container, message)
+        result[id] = message
+    return result
+
+
+def reserve_id(container, id, max_tries=100):
+    """Return a unique and valid id for a new item in the container.
+
+    Tries ``id``, ``id-1``, ``id-2`` and so on, validated with check_ids.
+    The chosen id is reserved until the current transaction ends.  So when
+    several threads add items with the same title to the same folder, they
+    get different ids, instead of all writing the same key and all but one
+    failing with a ConflictError and being retried.  After a commit, the id
+    stays reserved for transactions that started before it, and do not see
+    the new item yet.
+
+    Use this in name choosers, for example with the normalized title from
+    INameFromTitle.  Raises ValueError if no valid id was found.
+    """
+    path = "/".join(container.getPhysicalPath())
+    base = aq_base(container)
+    jar = getattr(base, "_p_jar", None)
+    serial = None
+    if jar is not None:
+        # The serial of the container tells which commits this transaction
+        # sees.
+        base._p_activate()
+        serial = base._p_serial
+    candidates = [id] + [f"{id}-{n}" for n in range(1, max_tries)]
+    chunk_size = 10
+    for start in range(0, len(candidates), chunk_size):
+        with _reserved_names_lock:
+            reserved = _get_reserved_names(path, serial)
+        chunk = [c for c in candidates[start : start + chunk_size] if c not in reserved]
+        errors = check_ids(container, chunk)
+        for candidate in chunk:
+            if errors[candidate] is not None:
+                continue
+            with _reserved_names_lock:
+                if candidate in _get_reserved_names(path, serial):
+                    # taken by another thread meanwhile
+                    continue
+                _reserved_names.setdefault(path, {})[candidate] = None
+            if jar is not None:
+                txn = jar.transaction_manager.get()
+            else:
+                txn = transaction.get()
+            txn.addAfterCommitHook(
+                _release_id_after_commit, args=(path, candidate, base)
+            )
+            txn.addAfterAbortHook(_release_id, args=(path, candidate))
+            return candidate
+    raise ValueError(f"Cannot find a unique id for {id} in {path}")
+
+
+def _get_reserved_names(path, serial):
+    # The ids reserved in the container for a transaction that sees the
+    # container with serial.  Call with the lock held.
+    reserved = _reserved_names.get(path)
+    if not reserved:
+        return set()
+    result = set()
+    expired = time.time() - RESERVATION_GRACE
+    for id, committed in list(reserved.items()):
+        if committed is None:
+            result.add(id)
+        elif committed[1] < expired:
+            del reserved[id]
+        elif serial is not None and serial < committed[0]:
+            # committed after the snapshot of this transaction
+            result.add(id)
+    if not reserved:
+        del _reserved_names[path]
+    return result
+
+
+def _release_id(path, id):
+    with _reserved_names_lock:
+        reserved = _reserved_names.get(path)
+        if reserved is not None:
+            reserved.pop(id, None)
+            if not reserved:
+                del _reserved_names[path]
+
+
+def _release_id_after_commit(status, path, id, container):
+    serial = getattr(container, "_p_serial", None)
+    if not status or getattr(container, "_p_jar", None) is None or serial is None:
+        _release_id(path, id)
+        return
+    now = time.time()
+    with _reserved_names_lock:
+        reserved = _reserved_names.get(path)
+        if reserved is not None and id in reserved:
+            reserved[id] = (serial, now)
+        if now - _reserved_names_pruned[0] > RESERVATION_GRACE:
+            # Drop the expired ids of containers not used again since.
+            _reserved_names_pruned[0] = now
+            for other in list(_reserved_names):
+                _get_reserved_names(other, None)
+
+
+def get_reserved_ids(catalog):
+    """Return a frozenset of ids that cannot be used for content.
+
+    These are RESERVED_IDS plus the names of the indexes and metadata
+    columns of the catalog.  The set is cached until the catalog changes,
+    which is the case when indexes or columns are added or removed.
+    """
+    catalog_base = getattr(aq_base(catalog), "_catalog", None)
+    if catalog_base is None or getattr(catalog_base, "_p_jar", None) is None:
+        # No serial to cache on
+        return RESERVED_IDS.union(catalog.indexes(), catalog.schema())
+    # A ghost has no serial yet, or still the serial of the state that was
+    # invalidated by a commit of another connection.
+    catalog_base._p_activate()
+    if catalog_base._p_changed:
+        # Changed in this transaction, so the serial is outdated
+        return RESERVED_IDS.union(catalog.indexes(), catalog.schema())
+    key = (catalog.getPhysicalPath(), catalog_base._p_serial)
+    reserved = _reserved_ids.get(key)
+    if reserved is None:
+        reserved = RESERVED_IDS.union(catalog.indexes(), catalog.schema())
+        _reserved_ids[key] = reserved
+    return reserved
+
+
+def _catalog_user_key(catalog):
+    # The roles and groups of the current user that the catalog filters
+    # results on, or the user id for catalogs without that filter.
+    user = getSecurityManager().getUser()
+    if getattr(aq_base(catalog), "_listAllowedRolesAndUsers", None) is not None:
+        return tuple(sorted(catalog._listAllowedRolesAndUsers(user)))
+    return user.getId()
+
+
+def _get_tool(context, name):
+    # getToolByName(context, name, None), memoized per site for the
+    # lifetime of the request.
+    site = getSite()
+    cache = get_request_cache("tools") if site is not None else None
+    if cache is None:
+        return getToolByName(context, name, None)
+    key = (id(aq_base(site)), name)
+    tool = cache.get(key, _marker)
+    if tool is _marker:
+        tool = cache[key] = getToolByName(context, name, None)
+    return tool
+
+
 def _check_for_collision(contained_by, cid, **kwargs):
     """Check for collisions of an object id in a container.
 
@@ -499,75 +870,112 @@ def _check_for_collision(contained_by, cid, **kwargs):
     For safety, we let the check_id
     function do a try/except Unauthorized when calling us.
     """
-    # Check for an existing object.
-    if cid in contained_by:
-        existing_obj = getattr(contained_by, cid, None)
-        if getattr(aq_base(existing_obj), "portal_type", _marker) is not _marker:
-            return _(
-                "There is already an item named ${name} in this folder.",
-                mapping={"name": cid},
-            )
+    return _CollisionChecker(contained_by).check(cid, **kwargs)
 
-    if cid == "index_html":
-        # always allow index_html
-        return
 
-    # containers may have a field / attribute of the same name
-    if base_hasattr(contained_by, cid):
-        return _("${name} is reserved.", mapping={"name": cid})
+class _CollisionChecker:
+    """Check ids for collisions in one container, see _check_for_collision.
 
-    if base_hasattr(contained_by, "checkIdAvailable"):
-        # ‌`checkIdAvailable` is implemented by
-        # ‌`Products.CMFCore.PortalFolder.PortalFolderBase`
+    The parts which only depend on the container are computed lazily and
+    only once, so that many ids can be checked cheaply, see check_ids.
+    """
+
+    def __init__(self, contained_by):
+        self.contained_by = contained_by
+
+    @cached_property
+    def id_available_check(self):
+        # `checkIdAvailable` is implemented by
+        # `Products.CMFCore.PortalFolder.PortalFolderBase`
         # Historically this used to be called from the check_id skin script,
         # which would check the permission automatically,
         # and the code would catch the Unauthorized exception.
-        if getSecurityManager().checkPermission(AddPortalContent, contained_by):
-            if not contained_by.checkIdAvailable(cid):
-                return _("${name} is reserved.", mapping={"name": cid})
+        contained_by = self.contained_by
+        return base_hasattr(contained_by, "checkIdAvailable") and bool(
+            getSecurityManager().checkPermission(AddPortalContent, contained_by)
+        )
 
-    # containers may implement this hook to further restrict ids
-    if getattr(aq_base(contained_by), "checkValidId", _marker) is not _marker:
-        try:
-            contained_by.checkValidId(cid)
-        except ConflictError:
-            raise
-        except Exception:
+    @cached_property
+    def method_aliases(self):
+        contained_by = self.contained_by
+        plone_utils = _get_tool(contained_by, "plone_utils")
+        portal_types = _get_tool(contained_by, "portal_types")
+        if plone_utils is not None and portal_types is not None:
+            parentFti = portal_types.getTypeInfo(contained_by)
+            if parentFti is not None:
+                aliases = plone_utils.getMethodAliases(parentFti)
+                if aliases is not None:
+                    return frozenset(aliases.keys())
+        return frozenset()
+
+    @cached_property
+    def portal(self):
+        return getSite()
+
+    @cached_property
+    def portal_content_ids(self):
+        portal = self.portal
+        return frozenset(portal.contentIds()) if portal else frozenset()
+
+    def check(self, cid, **kwargs):
+        contained_by = self.contained_by
+        # Check for an existing object.
+        if cid in contained_by:
+            existing_obj = getattr(contained_by, cid, None)
+            if getattr(aq_base(existing_obj), "portal_type", _marker) is not _marker:
+                return _(
+                    "There is already an item named ${name} in this folder.",
+                    mapping={"name": cid},
+                )
+
+        if cid == "index_html":
+            # always allow index_html
+            return
+
+        # containers may have a field / attribute of the same name
+        if base_hasattr(contained_by, cid):
             return _("${name} is reserved.", mapping={"name": cid})
 
-    # make sure we don't collide with any parent method aliases
-    plone_utils = getToolByName(contained_by, "plone_utils", None)
-    portal_types = getToolByName(contained_by, "portal_types", None)
-    if plone_utils is not None and portal_types is not None:
-        parentFti = portal_types.getTypeInfo(contained_by)
-        if parentFti is not None:
-            aliases = plone_utils.getMethodAliases(parentFti)
-            if aliases is not None and cid in aliases.keys():
+        if self.id_available_check:
+            if not contained_by.checkIdAvailable(cid):
                 return _("${name} is reserved.", mapping={"name": cid})
 
-    # Lastly, we want to disallow the id of any of the tools in the portal
-    # root, as well as any object that can be acquired via portal_skins.
-    # However, we do want to allow overriding of *content* in the object's
-    # parent path, including the portal root.
+        # containers may implement this hook to further restrict ids
+        if getattr(aq_base(contained_by), "checkValidId", _marker) is not _marker:
+            try:
+                contained_by.checkValidId(cid)
+            except ConflictError:
+                raise
+            except Exception:
+                return _("${name} is reserved.", mapping={"name": cid})
 
-    portal = getSite()
-    if portal and cid in portal.contentIds():
-        # Fine to use the same id as a *content* item from the root.
-        return
-    # It is allowed to give an object the same id as another
-    # container in it's acquisition path as long as the
-    # object is outside the portal.
-    outsideportal = getattr(aq_parent(portal), cid, None)
-    insideportal = getattr(portal, cid, None)
-    if (
-        insideportal is not None
-        and outsideportal is not None
-        and aq_base(outsideportal) == aq_base(insideportal)
-    ):
-        return
-    # but not other things
-    if getattr(portal, cid, None) is not None:
-        return _("${name} is reserved.", mapping={"name": cid})
+        # make sure we don't collide with any parent method aliases
+        if cid in self.method_aliases:
+            return _("${name} is reserved.", mapping={"name": cid})
+
+        # Lastly, we want to disallow the id of any of the tools in the portal
+        # root, as well as any object that can be acquired via portal_skins.
+        # However, we do want to allow overriding of *content* in the object's
+        # parent path, including the portal root.
+
+        portal = self.portal
+        if portal and cid in self.portal_content_ids:
+            # Fine to use the same id as a *content* item from the root.
+            return
+        # It is allowed to give an object the same id as another
+        # container in it's acquisition path as long as the
+        # object is outside the portal.
+        outsideportal = getattr(aq_parent(portal), cid, None)
+        insideportal = getattr(portal, cid, None)
+        if (
+            insideportal is not None
+            and outsideportal is not None
+            and aq_base(outsideportal) == aq_base(insideportal)
+        ):
+            return
+        # but not other things
+        if getattr(portal, cid, None) is not None:
+            return _("${name} is reserved.", mapping={"name": cid})
 
 
 def get_user_friendly_types(types_list=None):
@@ -578,17 +986,37 @@ def get_user_friendly_types(types_list=None):
 
     If typesList is given, this is used as the base list;
     else all types from portal_types are used.
+
+    The user friendly types are cached per site until the types tool or the
+    `types_not_searched` setting changes.
     """
     registry = getUtility(IRegistry)
-    search_settings = registry.forInterface(ISearchSchema, prefix="plone")
+    types_not_searched = registry.get("plone.types_not_searched", _marker)
+    if types_not_searched is _marker:
+        search_settings = registry.forInterface(ISearchSchema, prefix="plone")
+        types_not_searched = search_settings.types_not_searched
     ttool = getUtility(ITypesTool)
-    types = set(ttool.keys())
+    friendly_types = _get_user_friendly_types(ttool, tuple(types_not_searched or ()))
     if types_list:
-        types = {t for t in types_list if t in types}
-    friendly_types = types - set(search_settings.types_not_searched)
+        return list(friendly_types.intersection(types_list))
     return list(friendly_types)
 
 
+def _get_user_friendly_types(ttool, types_not_searched):
+    # Cached per types tool, until it or the types_not_searched setting
+    # changes.  Adding or removing an FTI changes the types tool and thus
+    # its serial, also for other ZEO clients.
+    base = aq_base(ttool)
+    if getattr(base, "_p_jar", None) is None or base._p_changed:
+        return frozenset(ttool.keys()).difference(types_not_searched)
+    key = (ttool.getPhysicalPath(), base._p_serial, types_not_searched)
+    friendly_types = _user_friendly_types.get(key)
+    if friendly_types is None:
+        friendly_types = frozenset(ttool.keys()).difference(types_not_searched)
+        _user_friendly_types[key] = friendly_types
+    return friendly_types
+
+
 def unrestricted_construct_instance(type_name, container, id, *args, **kw):
     """Create an object without performing security checks
 
@@ -672,6 +1100,10 @@ def boolean_value(value, default: bool | None = None) -> bool:
 # multi-space, so called 'waji-kankaku', unicode u'\u3000'
 MULTISPACE = "\u3000"
 BAD_CHARS = ("?", "-", "+", "*", MULTISPACE)
+_BAD_CHARS_TABLE = str.maketrans(dict.fromkeys(BAD_CHARS, " "))
+_quoted_phrase_regexp = re.compile(r'"([^"]*)"')
+# Tokens of munged search queries
+_search_tokens = LRUCache(maxsize=1000)
 
 
 def _search_quote_chars(s):
@@ -700,29 +1132,63 @@ def munge_search_term(query):
     Quoted phrases are left intact. Boolean operators (and/or/not) are
     quoted to prevent ZCTextIndex from interpreting them as logical atoms.
     """
-    for char in BAD_CHARS:
-        query = query.replace(char, " ")
-
-    # extract quoted phrases first
-    quoted_phrases = re.findall(r'"([^"]*)"', query)
-    r = []
-    for qp in quoted_phrases:
-        # remove from query
-        query = query.replace(f'"{qp}"', "")
-        # clean leading/trailing whitespaces and skip empty phrases
-        clean_qp = qp.strip()
-        if not clean_qp:
-            continue
-        r.append(f'"{clean_qp}"')
+    return " AND ".join(tokenize_search_term(query))
 
-    for term in query.strip().split():
+
+def tokenize_search_term(query):
+    """Split a search query into atoms for ZCTextIndex, see munge_search_term.
+
+    Returns a tuple with the quoted phrases followed by the terms.  Terms for
+    prefix matching end with ``*``.  The results are cached, and the tokens
+    of a query extending a cached query by more terms are derived from
+    those of the cached one.
+    """
+    query = query.translate(_BAD_CHARS_TABLE)
+    tokens = _search_tokens.get(query)
+    if tokens is None:
+        tokens = _search_tokens[query] = _tokenize_search_term(query)
+    phrases, terms = tokens
+    return phrases + terms
+
+
+def _tokenize_search_term(query):
+    # Returns a tuple of quoted phrases and a tuple of terms.
+    if '"' not in query:
+        # While typing in livesearch, we have seen the query up to the
+        # last term before.
+        cut = query.rstrip().rfind(" ")
+        if cut > 0:
+            prefix = _search_tokens.get(query[:cut])
+            if prefix is not None:
+                return (), prefix[1] + _search_terms(query[cut:])
+        return (), _search_terms(query)
+
+    # split in the text outside quotes and the quoted phrases
+    parts = _quoted_phrase_regexp.split(query)
+    phrases = parts[1::2]
+    outside = "".join(parts[::2])
+    if '"' in outside or any(not qp or qp in outside for qp in phrases):
+        # Removing a phrase may also remove text outside of quotes,
+        # remove them one by one like we always did.
+        outside = query
+        for qp in phrases:
+            outside = outside.replace(f'"{qp}"', "")
+
+    # clean leading/trailing whitespaces and skip empty phrases
+    phrases = tuple(f'"{qp.strip()}"' for qp in phrases if qp.strip())
+    return phrases, _search_terms(outside)
+
+
+def _search_terms(query):
+    terms = []
+    for term in query.split():
         quoted = _search_quote(term)
         # Add wildcard for prefix matching, but not for terms that
         # were quoted (boolean operators like "and"/"or"/"not", or
         # terms with parentheses) — wildcard on quoted terms is
         # invalid ZCTextIndex syntax.
         if quoted.startswith('"'):
-            r.append(quoted)
+            terms.append(quoted)
         else:
-            r.append(quoted + "*")
-    return " AND ".join(r)
+            terms.append(quoted + "*")
+    return tuple(terms)